@@ -0,0 +1,299 @@
+# CS122: Auto-completing keyboard using Tries
+# Autocomplete server
+#
+# Jake Underland
+#
+# Loads one EnglishDictionary and answers queries from any number of
+# clients over a local TCP (or Unix) socket, so that the load cost is paid
+# once instead of by every shell.
+#
+# The protocol is one JSON object per line in each direction. A request is
+#
+#   {"id": 1, "op": "num_completions", "arg": "ab"}
+#
+# where op is one of OPS ("get_completions" and "fuzzy_versions" also
+# take an optional "limit", at most MAX_LIMIT and DEFAULT_LIMIT if not
+# given, "fuzzy_versions" an optional "max_edits", at most MAX_EDITS), and
+# the response is
+#
+#   {"id": 1, "result": 596}      or      {"id": 1, "error": "..."}
+#
+# Several requests can be sent as one line, {"batch": [request, ...]}, and
+# are answered with one line, {"batch": [response, ...]}. The "metrics" op
+# returns request counts, cache hit rates and latency percentiles.
+#
+# The dictionary work is done in a pool of threads, so that a slow request
+# (a fuzzy_versions with a large max_edits, say) does not hold up the
+# event loop, and with it every other client.
+#
+# Usage: python3 autocomplete_server.py [--port PORT | --unix PATH] WORD_FILE
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import json
+import math
+import socket
+import threading
+import time
+
+import english_dictionary
+
+DEFAULT_PORT = 8122
+CACHE_SIZE = 4096
+# number of recent latencies per op kept for the percentiles
+LATENCY_WINDOW = 10000
+PERCENTILES = (50, 90, 99)
+# bounds on the options of a request, which also bound the size of what
+# is cached for it
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_EDITS = 3
+WORKERS = 4
+
+
+def bounded_option(request, name, default, upper, integer):
+    '''
+    Get an option of a request, checking that it is a number between 0 and
+    upper (an integer if integer is true).
+
+    Returns: the option, or default if it is not given
+    '''
+    value = request.get(name, default)
+    if isinstance(value, bool) or not isinstance(
+            value, int if integer else (int, float)) or \
+            not math.isfinite(value) or not 0 <= value <= upper:
+        raise ValueError("%s must be %s from 0 to %s" % (
+            name, "an integer" if integer else "a number", upper))
+    return value
+
+
+class AutocompleteService(object):
+    def __init__(self, eng_dict, cache_size=CACHE_SIZE):
+        '''
+        Constructor
+
+        Inputs:
+          eng_dict (EnglishDictionary): the shared dictionary
+          cache_size (int): entries kept in each LRU cache
+        '''
+        self.eng_dict = eng_dict
+        # completions and suggestions are cached because clients typing
+        # ask for the same short prefixes over and over
+        self.completions = functools.lru_cache(maxsize=cache_size)(
+            self.completions_uncached)
+        self.suggestions = functools.lru_cache(maxsize=cache_size)(
+            self.suggestions_uncached)
+        self.ops = {"is_word": self.is_word,
+                    "num_completions": self.num_completions,
+                    "get_completions": self.get_completions,
+                    "fuzzy_versions": self.fuzzy_versions,
+                    "metrics": self.metrics}
+        self.latencies = collections.defaultdict(
+            lambda: collections.deque(maxlen=LATENCY_WINDOW))
+        self.num_requests = collections.Counter()
+        self.num_errors = 0
+        # requests are handled by several threads
+        self.stats_lock = threading.Lock()
+
+    def is_word(self, request):
+        return self.eng_dict.is_word(request["arg"])
+
+    def num_completions(self, request):
+        return self.eng_dict.num_completions(request["arg"])
+
+    def completions_uncached(self, prefix, limit):
+        return tuple(self.eng_dict.iter_completions(prefix, limit))
+
+    def get_completions(self, request):
+        limit = bounded_option(request, "limit", DEFAULT_LIMIT, MAX_LIMIT,
+                               True)
+        return list(self.completions(request["arg"], limit))
+
+    def suggestions_uncached(self, word, max_edits):
+        return tuple(self.eng_dict.fuzzy_versions(word, max_edits)
+                     [:MAX_LIMIT])
+
+    def fuzzy_versions(self, request):
+        max_edits = bounded_option(request, "max_edits", 1, MAX_EDITS, False)
+        limit = bounded_option(request, "limit", DEFAULT_LIMIT, MAX_LIMIT,
+                               True)
+        return list(self.suggestions(request["arg"], max_edits)[:limit])
+
+    def metrics(self, request):
+        '''
+        Request counts, cache statistics and latency percentiles in
+        microseconds for each op
+        '''
+        with self.stats_lock:
+            samples_by_op = {op: list(samples)
+                             for op, samples in self.latencies.items()}
+            requests = dict(self.num_requests)
+        latency = {}
+        for op, samples in samples_by_op.items():
+            ordered = sorted(samples)
+            latency[op] = {
+                "p%d" % p: ordered[min(len(ordered) - 1,
+                                       len(ordered) * p // 100)] * 1e6
+                for p in PERCENTILES}
+
+        caches = {}
+        for name, cache in (("completions", self.completions),
+                            ("suggestions", self.suggestions)):
+            info = cache.cache_info()
+            lookups = info.hits + info.misses
+            caches[name] = {"hits": info.hits, "misses": info.misses,
+                            "size": info.currsize,
+                            "hit_rate": info.hits / lookups if lookups else 0}
+
+        return {"requests": requests,
+                "errors": self.num_errors,
+                "caches": caches,
+                "latency_us": latency}
+
+    def handle(self, request):
+        '''
+        Answer one request (a dictionary), timing it.
+
+        Returns: the response dictionary
+        '''
+        response = {"id": request.get("id")} if isinstance(request, dict) \
+            else {"id": None}
+        start = time.perf_counter()
+        try:
+            op = self.ops[request["op"]]
+            response["result"] = op(request)
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            with self.stats_lock:
+                self.num_errors += 1
+            response["error"] = "bad request: %r" % (e,)
+            return response
+
+        name = request["op"]
+        with self.stats_lock:
+            self.num_requests[name] += 1
+            self.latencies[name].append(time.perf_counter() - start)
+        return response
+
+    def handle_line(self, line):
+        '''
+        Answer one line of the protocol (a request or a batch).
+
+        Returns: the response line, as bytes
+        '''
+        try:
+            message = json.loads(line)
+        except ValueError:
+            with self.stats_lock:
+                self.num_errors += 1
+            response = {"id": None, "error": "invalid JSON"}
+        else:
+            if isinstance(message, dict) and "batch" in message:
+                response = {"batch": [self.handle(r)
+                                      for r in message["batch"]]}
+            else:
+                response = self.handle(message)
+        return json.dumps(response).encode() + b"\n"
+
+
+async def serve_client(service, executor, reader, writer):
+    '''
+    Answer the requests of one client until it disconnects, handling them
+    in executor
+    '''
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            writer.write(await loop.run_in_executor(
+                executor, service.handle_line, line))
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, port=DEFAULT_PORT, unix_path=None):
+    '''
+    Serve forever on localhost:port, or on a Unix socket if unix_path is
+    given.
+    '''
+    with concurrent.futures.ThreadPoolExecutor(WORKERS) as executor:
+        handler = functools.partial(serve_client, service, executor)
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(handler, unix_path)
+        else:
+            server = await asyncio.start_server(handler, "127.0.0.1", port)
+        async with server:
+            await server.serve_forever()
+
+
+class AutocompleteClient(object):
+    '''
+    Minimal blocking client for the server
+    '''
+
+    def __init__(self, port=DEFAULT_PORT, unix_path=None):
+        if unix_path is not None:
+            self.sock = socket.socket(socket.AF_UNIX)
+            self.sock.connect(unix_path)
+        else:
+            self.sock = socket.create_connection(("127.0.0.1", port))
+        self.file = self.sock.makefile("rwb")
+        self.next_id = 0
+
+    def request(self, op, arg=None, **options):
+        '''
+        Send one request and return its result (raising ValueError if the
+        server reports an error)
+        '''
+        return self.batch([dict(op=op, arg=arg, **options)])[0]
+
+    def batch(self, requests):
+        '''
+        Send a list of request dictionaries as one batch.
+
+        Returns: list of results, in order
+        '''
+        for r in requests:
+            r["id"] = self.next_id
+            self.next_id += 1
+        self.file.write(json.dumps({"batch": requests}).encode() + b"\n")
+        self.file.flush()
+
+        results = []
+        for response in json.loads(self.file.readline())["batch"]:
+            if "error" in response:
+                raise ValueError(response["error"])
+            results.append(response["result"])
+        return results
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve dictionary queries over a local socket.")
+    parser.add_argument("wordfile", metavar="WORD_FILE")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH",
+                        help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--backend", default="mmap",
+                        choices=english_dictionary.BACKENDS)
+    args = parser.parse_args()
+
+    print("Loading words into trie...")
+    service = AutocompleteService(english_dictionary.EnglishDictionary(
+        args.wordfile, backend=args.backend))
+    print("Serving on %s" % (args.unix or "127.0.0.1:%d" % args.port))
+    try:
+        asyncio.run(serve(service, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
@@ -100,7 +100,10 @@ def did_you_mean(eng_dict, word):
     Return a list of possible correct words that are "near" to the
     current word.
     '''
-    fv = []  # trie.fuzzy_versions(t, word)
+    if hasattr(eng_dict, "fuzzy_versions"):
+        fv = eng_dict.fuzzy_versions(word)
+    else:
+        fv = []
     if len(fv) == 0:
         return
     if len(fv) <= 20:
@@ -130,13 +133,62 @@ def prompt(message, word):
     sys.stdout.flush()
 
 
-def process_completions(eng_dict, message, word, print_candidates):
+class WordCursor(object):
+    '''
+    Stand-in for EnglishDictionary.cursor() for dictionaries without one:
+    it keeps the word as a string and queries the dictionary with the
+    whole word every time.
+    '''
+
+    def __init__(self, eng_dict):
+        self.eng_dict = eng_dict
+        self.prefix = ""
+
+    def reset(self):
+        self.prefix = ""
+
+    def push(self, char):
+        self.prefix += char
+
+    def pop(self):
+        self.prefix = self.prefix[:-1]
+
+    @property
+    def count(self):
+        return self.eng_dict.num_completions(self.prefix)
+
+    def is_word(self):
+        return self.eng_dict.is_word(self.prefix)
+
+    def completions(self, limit=None):
+        return self.eng_dict.get_completions(self.prefix)[:limit]
+
+
+def new_cursor(eng_dict):
+    '''
+    Get a cursor for typing a word into eng_dict one letter at a time
+    '''
+    if hasattr(eng_dict, "cursor"):
+        return eng_dict.cursor()
+    return WordCursor(eng_dict)
+
+
+def learn_word(eng_dict, word):
+    '''
+    Tell the dictionary (if it learns word frequencies) that word was used
+    '''
+    if hasattr(eng_dict, "bump"):
+        eng_dict.bump(word)
+
+
+def process_completions(eng_dict, cursor, message, word, print_candidates):
     '''
     Process the current "word" and generate a new message and prompt,
     information about possible completions, an error message, or
-    information about possible corrections to the word.
+    information about possible corrections to the word. cursor must be
+    positioned at word; it is reset if the word is completed.
     '''
-    n = eng_dict.num_completions(word)
+    n = cursor.count
     misspelled = False
 
     if n == 0:
@@ -148,20 +200,26 @@ def process_completions(eng_dict, message, word, print_candidates):
     elif n == 1:
         # If there is only one possible completion, go ahead and add
         # the word to the message.
-        word += eng_dict.get_completions(word)[0]
+        word += cursor.completions(1)[0]
+        learn_word(eng_dict, word)
         if len(message) > 0:
             message += " "
         message += word
         word = ""
+        cursor.reset()
         print()
         prompt(message, word)
     else:
         if print_candidates:
             if n > 10:
                 print("\n(" + str(n) + " completions)")
+                # show the likeliest few, if the dictionary knows them
+                if hasattr(eng_dict, "top_completions"):
+                    for com in eng_dict.top_completions(word, 5):
+                        print(word + com)
             else:
                 print()
-                for com in eng_dict.get_completions(word):
+                for com in cursor.completions(10):
                     print(word + com)
             prompt(message, word)
 
@@ -177,6 +235,7 @@ def shell(eng_dict):
     '''
     message = ""
     word = ""
+    cursor = new_cursor(eng_dict)
     misspelled = False
     prompt(message, word)
     while True:
@@ -187,6 +246,7 @@ def shell(eng_dict):
         if ord(c) == 4:
             message = ""
             word = ""
+            cursor.reset()
             misspelled = False
             print()
             prompt(message, word)
@@ -197,15 +257,17 @@ def shell(eng_dict):
             if misspelled:
                 misspelled_prompt(message, eng_dict, word)
             else:
-                if not eng_dict.is_word(word):
+                if not cursor.is_word():
                     print("\nWord '%s' does not exist" % word)
                     did_you_mean(eng_dict, word)
                     prompt(message, word)
                 else:
+                    learn_word(eng_dict, word)
                     if len(message) > 0:
                         message += " "
                     message += word
                     word = ""
+                    cursor.reset()
                     print()
                     prompt(message, word)
 
@@ -214,7 +276,7 @@ def shell(eng_dict):
         # Autocomplete
         if c == "\t":
             if word != "":
-                message, word, misspelled = process_completions(eng_dict, message, word, print_candidates=True)
+                message, word, misspelled = process_completions(eng_dict, cursor, message, word, print_candidates=True)
             continue
 
         # Backspace
@@ -223,6 +285,7 @@ def shell(eng_dict):
                 print("cannot change previous word once accepted")
                 continue
             word = word[:len(word) - 1]
+            cursor.pop()
             sys.stdout.write('\r')
             sys.stdout.flush()
             prompt(message, word + " ")
@@ -239,13 +302,15 @@ def shell(eng_dict):
             sys.stdout.write(c)
             sys.stdout.flush()
             word = word + c
+            cursor.push(c)
 
-        message, word, misspelled = process_completions(eng_dict, message, word, print_candidates=False)
+        message, word, misspelled = process_completions(eng_dict, cursor, message, word, print_candidates=False)
 
 
-def go(module_name=None):
+def go(module_name=None, **dict_kwargs):
     '''
-    Process the arguments and fire up the shell.
+    Process the arguments and fire up the shell. Any keyword arguments are
+    passed on to the module's EnglishDictionary constructor.
     '''
 
     global module
@@ -265,8 +330,12 @@ def go(module_name=None):
         exit(1)
 
     print("Loading words into trie...",)
-    eng_dict = module.EnglishDictionary(wordfile)
-    print(" done")
+    eng_dict = module.EnglishDictionary(wordfile, **dict_kwargs)
+    load_rate = getattr(eng_dict, "load_rate", None)
+    if load_rate is None:
+        print(" done")
+    else:
+        print(" done (%.0f words/sec)" % load_rate)
     print("===================================================")
     print("      Welcome to the auto-completing shell!")
     print()
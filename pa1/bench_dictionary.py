@@ -0,0 +1,223 @@
+# CS122: Auto-completing keyboard using Tries
+# Benchmarks for the EnglishDictionary backends
+#
+# Jake Underland
+#
+# Usage: python3 bench_dictionary.py WORD_FILE [spelling | dawg | load]
+
+import random
+import sys
+import time
+import tracemalloc
+
+import dawg
+import english_dictionary
+import english_dictionary_list
+
+
+NUM_QUERIES = 2000
+NUM_TYPOS = 300
+
+# Load time budgets in seconds for web2, about 3x what the list and trie
+# implementations take on a laptop. A load slower than this is a
+# regression (e.g. duplicate checks going back to scanning the list).
+LOAD_TIME_LIMITS = {"list": 1.0, "trie": 3.0}
+LOAD_REPEATS = 3
+
+
+def measure_build(wordfile, backend):
+    '''
+    Build an EnglishDictionary, measuring the time taken and the memory it
+    holds once built.
+
+    Inputs:
+      wordfile (string): name of the file with the words.
+      backend (string): one of english_dictionary.BACKENDS
+
+    Returns: (EnglishDictionary, float, int) the dictionary, the build time
+      in seconds and the number of bytes allocated for it.
+    '''
+    tracemalloc.start()
+    start = time.perf_counter()
+    eng_dict = english_dictionary.EnglishDictionary(wordfile, backend=backend)
+    elapsed = time.perf_counter() - start
+    nbytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return eng_dict, elapsed, nbytes
+
+
+def sample_queries(wordfile, num_queries=NUM_QUERIES, seed=0):
+    '''
+    Pick words from the word file and prefixes of those words to use as
+    queries.
+
+    Returns: (list of strings, list of strings) the words and the prefixes
+    '''
+    with open(wordfile) as f:
+        words = [w.strip() for w in f if w.strip()]
+    rng = random.Random(seed)
+    words = rng.sample(words, min(num_queries, len(words)))
+    prefixes = [w[:rng.randint(1, len(w))] for w in words]
+
+    return words, prefixes
+
+
+def measure_latency(eng_dict, words, prefixes):
+    '''
+    Time is_word, num_completions and get_completions over the queries.
+
+    Returns: dictionary mapping method names to the mean latency in
+      microseconds
+    '''
+    queries = [("is_word", eng_dict.is_word, words),
+               ("num_completions", eng_dict.num_completions, prefixes),
+               ("get_completions", eng_dict.get_completions, prefixes)]
+
+    latencies = {}
+    for name, method, args in queries:
+        start = time.perf_counter()
+        for arg in args:
+            method(arg)
+        elapsed = time.perf_counter() - start
+        latencies[name] = elapsed / len(args) * 1e6
+
+    return latencies
+
+
+def compare_backends(wordfile, backends=english_dictionary.BACKENDS):
+    '''
+    Print a memory/latency comparison of the dictionary backends.
+    '''
+    words, prefixes = sample_queries(wordfile)
+
+    print("%-10s %10s %10s %14s %20s %20s" % (
+        "backend", "build (s)", "MB", "is_word (us)",
+        "num_completions (us)", "get_completions (us)"))
+    for backend in backends:
+        eng_dict, build_time, nbytes = measure_build(wordfile, backend)
+        latencies = measure_latency(eng_dict, words, prefixes)
+        print("%-10s %10.2f %10.1f %14.2f %20.2f %20.2f" % (
+            backend, build_time, nbytes / 2**20, latencies["is_word"],
+            latencies["num_completions"], latencies["get_completions"]))
+
+
+def make_typos(words, num_typos=NUM_TYPOS, seed=0):
+    '''
+    Misspell words by replacing, inserting or deleting one letter.
+
+    Returns: list of strings
+    '''
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    typos = []
+    for w in rng.sample(words, min(num_typos, len(words))):
+        i = rng.randrange(len(w))
+        edit = rng.choice(("replace", "insert", "delete"))
+        if edit == "replace":
+            w = w[:i] + rng.choice(letters) + w[i + 1:]
+        elif edit == "insert":
+            w = w[:i] + rng.choice(letters) + w[i:]
+        elif len(w) > 1:
+            w = w[:i] + w[i + 1:]
+        typos.append(w)
+    return typos
+
+
+def compare_spelling(wordfile, distances=(1, 2), backend="compact"):
+    '''
+    Print a comparison of fuzzy_versions using the trie walk and using
+    SymSpell indexes of different distances: build time, index memory,
+    mean latency and the fraction of the walk's suggestions found.
+    '''
+    words, _ = sample_queries(wordfile)
+    typos = make_typos(words)
+    eng_dict = english_dictionary.EnglishDictionary(wordfile, backend=backend)
+
+    start = time.perf_counter()
+    expected = [set(eng_dict.fuzzy_versions(t)) for t in typos]
+    walk_latency = (time.perf_counter() - start) / len(typos) * 1e3
+
+    print("%-12s %10s %10s %14s %8s" % (
+        "method", "build (s)", "MB", "latency (ms)", "recall"))
+    print("%-12s %10s %10s %14.3f %8.3f" % (
+        "trie walk", "-", "-", walk_latency, 1))
+
+    for distance in distances:
+        start = time.perf_counter()
+        index = eng_dict.build_spell_index(distance)
+        build_time = time.perf_counter() - start
+        nbytes = index.memory_report()["total_bytes"]
+
+        start = time.perf_counter()
+        # fuzzy_versions would fall back to the walk for an index too
+        # small for max_edits 1, so query the index directly
+        found = [set(eng_dict.indexed_fuzzy_versions(t, 1)) for t in typos]
+        latency = (time.perf_counter() - start) / len(typos) * 1e3
+
+        num_expected = sum(len(e) for e in expected)
+        num_found = sum(len(e & f) for e, f in zip(expected, found))
+        recall = num_found / num_expected if num_expected else 1
+        print("%-12s %10.2f %10.1f %14.3f %8.3f" % (
+            "symspell-%d" % distance, build_time, nbytes / 2**20, latency,
+            recall))
+
+        eng_dict.spell_index = None
+
+
+def compare_node_counts(wordfile):
+    '''
+    Print the number of nodes in the trie and the number of states in the
+    minimal DAWG for the same words.
+    '''
+    trie = english_dictionary.EnglishDictionary(wordfile, backend="compact")
+    num_nodes = len(trie.words.trie)
+
+    start = time.perf_counter()
+    eng_dict = english_dictionary.EnglishDictionary(wordfile, backend="dawg")
+    build_time = time.perf_counter() - start
+    num_dawg_states = dawg.num_states(eng_dict.words)
+
+    print("trie nodes:  %d" % num_nodes)
+    print("DAWG states: %d (built in %.2f s)" % (num_dawg_states, build_time))
+    print("reduction:   %.1f%%" % (100 * (1 - num_dawg_states / num_nodes)))
+
+
+def check_load_times(wordfile, limits=LOAD_TIME_LIMITS):
+    '''
+    Time loading the word file with the list and trie implementations
+    (best of LOAD_REPEATS runs) and compare against the budgets in limits.
+
+    Returns: boolean, whether every load was within its budget
+    '''
+    loaders = {"list": english_dictionary_list.EnglishDictionary,
+               "trie": english_dictionary.EnglishDictionary}
+
+    ok = True
+    for name, loader in loaders.items():
+        best = float("inf")
+        for _ in range(LOAD_REPEATS):
+            start = time.perf_counter()
+            loader(wordfile)
+            best = min(best, time.perf_counter() - start)
+        within = best <= limits[name]
+        ok = ok and within
+        print("%-5s %6.2f s (limit %.2f s) %s" % (
+            name, best, limits[name], "ok" if within else "TOO SLOW"))
+    return ok
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2:
+        compare_backends(sys.argv[1])
+    elif len(sys.argv) == 3 and sys.argv[2] == "spelling":
+        compare_spelling(sys.argv[1])
+    elif len(sys.argv) == 3 and sys.argv[2] == "dawg":
+        compare_node_counts(sys.argv[1])
+    elif len(sys.argv) == 3 and sys.argv[2] == "load":
+        if not check_load_times(sys.argv[1]):
+            sys.exit(1)
+    else:
+        print("Usage: python3 bench_dictionary.py WORD_FILE "
+              "[spelling | dawg | load]")
+        sys.exit(1)
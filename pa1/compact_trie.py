@@ -0,0 +1,366 @@
+# CS122: Auto-completing keyboard using Tries
+# Compact, array-backed trie
+#
+# Jake Underland
+#
+# The trie is stored level by level (breadth-first) in flat arrays, the
+# same node order a LOUDS encoding uses. Because of that order the
+# children of every node are contiguous, so instead of a children dict
+# per node we only keep, for node i:
+#
+#   labels[i]       code point of the letter on the edge into node i
+#   first_child[i]  index of node i's first child; its children are the
+#                   nodes first_child[i] .. first_child[i + 1] - 1, sorted
+#                   by label
+#   counts[i]       number of words at or below node i
+#   finals[i]       1 if the path to node i spells a word
+#   weights[i]      frequency weight of that word (0 if it is not one)
+#   max_weights[i]  largest weight of a word at or below node i, which
+#                   bounds the best-first search of best_words
+#
+# Node 0 is the root. Children are found with a binary search over their
+# (sorted) labels. The arrays can be any sequence of ints supporting
+# len() and indexing, so the same code also reads typed memoryviews.
+# Since those may be read-only, weights changed with set_weight are kept
+# in dictionaries that take precedence over the arrays.
+
+import bisect
+import heapq
+from array import array
+from collections import deque
+
+import word_file
+
+
+class CompactTrie(object):
+    def __init__(self, labels, first_child, counts, finals, weights,
+                 max_weights):
+        '''
+        Constructor. Use CompactTrie.from_words or
+        CompactTrie.from_weighted_words to build a trie from words.
+
+        Inputs:
+          labels, first_child, counts, finals, weights, max_weights: the
+            node arrays described at the top of this file.
+        '''
+        self.labels = labels
+        self.first_child = first_child
+        self.counts = counts
+        self.finals = finals
+        self.weights = weights
+        self.max_weights = max_weights
+        # node index -> weight (or max_weight) changed with set_weight
+        self.new_weights = {}
+        self.new_max_weights = {}
+        # the mmap the arrays are views of, if any (see dictionary_index.py)
+        self.mapped = None
+        self.root = CompactTrieNode(self, 0)
+
+    @classmethod
+    def from_words(cls, words):
+        '''
+        Build a compact trie from an iterable of words, each with weight
+        word_file.DEFAULT_WEIGHT. Duplicates are ignored.
+
+        Inputs:
+          words (iterable of strings): the words
+
+        Returns: CompactTrie
+        '''
+        return cls.from_weighted_words(
+            (word, word_file.DEFAULT_WEIGHT) for word in words)
+
+    @classmethod
+    def from_weighted_words(cls, entries):
+        '''
+        Build a compact trie from an iterable of (word, weight) pairs. A
+        word that appears again keeps its first weight, as in
+        TrieNode.add_words.
+
+        Inputs:
+          entries (iterable of (string, int) pairs): the words and their
+            weights
+
+        Returns: CompactTrie
+        '''
+        weight_of = {}
+        for word, weight in entries:
+            weight_of.setdefault(word, weight)
+        words = sorted(weight_of)
+        word_weights = [weight_of[word] for word in words]
+
+        labels = array("I", [0])
+        first_child = array("I")
+        counts = array("I")
+        finals = array("B")
+        weights = array("q")
+        max_weights = array("q")
+
+        # Every node corresponds to a range words[lo:hi] of the sorted words
+        # sharing its prefix of length depth. Visiting the ranges in FIFO
+        # order numbers the nodes breadth-first.
+        ranges = deque([(0, len(words), 0)])
+        num_nodes = 1
+        while ranges:
+            lo, hi, depth = ranges.popleft()
+            counts.append(hi - lo)
+            max_weights.append(max(word_weights[lo:hi], default=0))
+            # sorting puts the word equal to the prefix first, if present
+            final = lo < hi and len(words[lo]) == depth
+            finals.append(final)
+            weights.append(word_weights[lo] if final else 0)
+            if final:
+                lo += 1
+
+            first_child.append(num_nodes)
+            while lo < hi:
+                char = words[lo][depth]
+                end = lo + 1
+                while end < hi and words[end][depth] == char:
+                    end += 1
+                labels.append(ord(char))
+                ranges.append((lo, end, depth + 1))
+                num_nodes += 1
+                lo = end
+        first_child.append(num_nodes)
+
+        return cls(labels, first_child, counts, finals, weights, max_weights)
+
+    def __len__(self):
+        '''
+        Number of nodes in the trie
+        '''
+        return len(self.counts)
+
+    def nbytes(self):
+        '''
+        Number of bytes used by the node arrays
+        '''
+        return sum(len(a) * a.itemsize for a in self.arrays())
+
+    def arrays(self):
+        '''
+        The node arrays, in the order of the constructor's arguments
+        '''
+        return (self.labels, self.first_child, self.counts, self.finals,
+                self.weights, self.max_weights)
+
+    def close(self):
+        '''
+        Release the mapped file the arrays are views of, if any. The trie
+        cannot be used afterwards.
+        '''
+        if self.mapped is not None:
+            for a in self.arrays():
+                a.release()
+            self.mapped.close()
+            self.mapped = None
+
+    def weight(self, index):
+        '''
+        Weight of the word ending at node index (0 if there is none)
+        '''
+        weight = self.new_weights.get(index)
+        return self.weights[index] if weight is None else weight
+
+    def max_weight(self, index):
+        '''
+        Largest weight of a word at or below node index
+        '''
+        weight = self.new_max_weights.get(index)
+        return self.max_weights[index] if weight is None else weight
+
+    def iter_weighted_words(self):
+        '''
+        Generates the (word, weight) pairs of the trie, in lexicographic
+        order.
+        '''
+        labels = self.labels
+        first_child = self.first_child
+        stack = [(0, "")]
+        while stack:
+            index, path = stack.pop()
+            if self.finals[index]:
+                yield path, self.weight(index)
+            for i in range(first_child[index + 1] - 1,
+                           first_child[index] - 1, -1):
+                stack.append((i, path + chr(labels[i])))
+
+    def child_index(self, index, char):
+        '''
+        Index of the child of node index along the edge labelled char, or
+        -1 if there is no such child.
+        '''
+        lo = self.first_child[index]
+        hi = self.first_child[index + 1]
+        code = ord(char)
+        i = bisect.bisect_left(self.labels, code, lo, hi)
+        if i < hi and self.labels[i] == code:
+            return i
+        return -1
+
+
+class CompactTrieNode(object):
+    '''
+    Lightweight view of one node of a CompactTrie, with the same attributes
+    as TrieNode (count, final, iter_children, traverse_nodes, iter_words,
+    find_words) so that EnglishDictionary can use either one.
+    '''
+
+    __slots__ = ("trie", "index")
+
+    def __init__(self, trie, index):
+        self.trie = trie
+        self.index = index
+
+    @property
+    def count(self):
+        return self.trie.counts[self.index]
+
+    @property
+    def final(self):
+        return bool(self.trie.finals[self.index])
+
+    @property
+    def weight(self):
+        return self.trie.weight(self.index)
+
+    @property
+    def max_weight(self):
+        return self.trie.max_weight(self.index)
+
+    @property
+    def children(self):
+        '''
+        Dictionary mapping letters to child nodes (built on each access)
+        '''
+        trie = self.trie
+        lo = trie.first_child[self.index]
+        hi = trie.first_child[self.index + 1]
+        return {chr(trie.labels[i]): CompactTrieNode(trie, i)
+                for i in range(lo, hi)}
+
+    def iter_children(self):
+        '''
+        Generates (letter, child node) pairs for the node's children, in
+        lexicographic order.
+        '''
+        trie = self.trie
+        for i in range(trie.first_child[self.index],
+                       trie.first_child[self.index + 1]):
+            yield chr(trie.labels[i]), CompactTrieNode(trie, i)
+
+    def traverse_nodes(self, word):
+        '''
+        Navigates to the node of the last letter in the word.
+
+        Inputs:
+          word (string): the word (or prefix)
+
+        Returns the CompactTrieNode for the last letter in word, or None if
+        word is not a path within self.
+        '''
+        trie = self.trie
+        index = self.index
+        for char in word:
+            index = trie.child_index(index, char)
+            if index < 0:
+                return None
+        return CompactTrieNode(trie, index)
+
+    def iter_words(self, prefix=""):
+        '''
+        Generates the complete words found under the node, in lexicographic
+        order, one at a time.
+
+        Inputs:
+          prefix (string): prepended to every word generated.
+
+        Yields words (strings) under the node.
+        '''
+        trie = self.trie
+        labels = trie.labels
+        first_child = trie.first_child
+        finals = trie.finals
+
+        stack = [(self.index, prefix)]
+        while stack:
+            index, path = stack.pop()
+            if finals[index]:
+                yield path
+            # push in reverse so the smallest label is visited first
+            for i in range(first_child[index + 1] - 1,
+                           first_child[index] - 1, -1):
+                stack.append((i, path + chr(labels[i])))
+
+    def find_words(self, prefix=""):
+        '''
+        Lists all complete words that are found under the node, in
+        lexicographic order.
+
+        Inputs:
+          prefix (string): prepended to every word found.
+
+        Returns a list of words (strings) under the node.
+        '''
+        return list(self.iter_words(prefix))
+
+    def best_words(self, k):
+        '''
+        The k words under the node with the highest weight, ties broken
+        alphabetically, found with the same best-first branch-and-bound
+        search as TrieNode.best_words.
+
+        Inputs:
+          k (int): number of words wanted
+
+        Returns: list of the words (strings, relative to the node), best
+          first
+        '''
+        trie = self.trie
+        labels = trie.labels
+        first_child = trie.first_child
+        # entries are (-weight, path, kind, node index), as in
+        # TrieNode.best_words; the node index makes them unique
+        heap = [(-trie.max_weight(self.index), "", 1, self.index)]
+        best = []
+        while heap and len(best) < k:
+            _, path, kind, index = heapq.heappop(heap)
+            if kind == 0:
+                best.append(path)
+                continue
+            if trie.finals[index]:
+                heapq.heappush(heap, (-trie.weight(index), path, 0, index))
+            for i in range(first_child[index], first_child[index + 1]):
+                heapq.heappush(heap, (-trie.max_weight(i),
+                                      path + chr(labels[i]), 1, i))
+        return best
+
+    def set_weight(self, word, weight):
+        '''
+        Change the frequency weight of a word under the node.
+
+        Inputs:
+          word (string): the word, relative to the node
+          weight (int): its new weight
+
+        Returns: boolean, whether word was found
+        '''
+        trie = self.trie
+        path = [self.index]
+        for char in word:
+            index = trie.child_index(path[-1], char)
+            if index < 0:
+                return False
+            path.append(index)
+        if not trie.finals[path[-1]]:
+            return False
+
+        trie.new_weights[path[-1]] = weight
+        # the bounds along the path may have changed in either direction
+        for index in reversed(path):
+            trie.new_max_weights[index] = max(
+                [trie.weight(index) if trie.finals[index] else 0]
+                + [trie.max_weight(i) for i in range(
+                    trie.first_child[index], trie.first_child[index + 1])])
+        return True
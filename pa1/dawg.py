@@ -0,0 +1,185 @@
+# CS122: Auto-completing keyboard using Tries
+# Minimal acyclic word automaton (DAWG)
+#
+# Jake Underland
+#
+# A trie shares prefixes but not suffixes: "walking", "talking" and
+# "stalking" each get their own "alking" chain. A DAWG also merges
+# states with identical futures (the same finality and the same outgoing
+# edges to the same states), which for English word lists removes most of
+# the nodes.
+#
+# The DAWG is built with Daciuk et al.'s incremental algorithm for sorted
+# input: each new word only diverges from the previous one after their
+# common prefix, so everything the previous word added below that point
+# can no longer change and is minimized right away, by replacing each
+# state with an equivalent one from a register of minimized states.
+#
+# Since equivalent states accept exactly the same suffixes, the number of
+# words below a state does not depend on how it was reached, so each state
+# can still keep a count for num_completions.
+
+import itertools
+
+
+class DawgNode(object):
+    '''
+    A DAWG state, with the same attributes as TrieNode (count, final,
+    children, iter_children, traverse_nodes, iter_words, find_words) so
+    that EnglishDictionary can use it in place of a trie.
+    '''
+
+    __slots__ = ("children", "final", "count")
+
+    def __init__(self):
+        self.children = {}  # keys are letters, values DawgNodes
+        self.final = False
+        self.count = 0
+
+    def signature(self):
+        '''
+        Key identifying the state up to equivalence, once its children
+        have been minimized
+        '''
+        return (self.final, tuple((char, id(child)) for char, child
+                                  in self.children.items()))
+
+    def iter_children(self):
+        '''
+        Generates (letter, child node) pairs for the node's children.
+        '''
+        return iter(self.children.items())
+
+    def traverse_nodes(self, word):
+        '''
+        Navigates to the state reached by the word.
+
+        Inputs:
+          word (string): the word (or prefix)
+
+        Returns the DawgNode reached, or None if word is not a path from
+        self.
+        '''
+        node = self
+        for char in word:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def iter_words(self, prefix=""):
+        '''
+        Generates the complete words found from the state, in
+        lexicographic order, one at a time.
+
+        Inputs:
+          prefix (string): prepended to every word generated.
+
+        Yields words (strings).
+        '''
+        stack = [(self, prefix)]
+        while stack:
+            node, path = stack.pop()
+            if node.final:
+                yield path
+            for char, child in reversed(node.children.items()):
+                stack.append((child, path + char))
+
+    def find_words(self, prefix=""):
+        '''
+        Lists all complete words that are found from the state.
+
+        Inputs:
+          prefix (string): prepended to every word found.
+
+        Returns a list of words (strings).
+        '''
+        return list(self.iter_words(prefix))
+
+
+def build_dawg(words):
+    '''
+    Build a minimal DAWG from an iterable of words. The words are sorted
+    (and deduplicated) first, unless they already are.
+
+    Inputs:
+      words (iterable of strings): the words
+
+    Returns: the root DawgNode
+    '''
+    words = list(words)
+    if any(a >= b for a, b in zip(words, itertools.islice(words, 1, None))):
+        words = sorted(set(words))
+
+    root = DawgNode()
+    register = {}
+    # (parent, letter, child) for the states added by the previous word
+    # that have not been minimized yet, from the root down
+    unchecked = []
+
+    def minimize(down_to):
+        while len(unchecked) > down_to:
+            parent, char, child = unchecked.pop()
+            signature = child.signature()
+            existing = register.get(signature)
+            if existing is None:
+                register[signature] = child
+            else:
+                parent.children[char] = existing
+
+    previous = ""
+    for word in words:
+        common = 0
+        for a, b in zip(word, previous):
+            if a != b:
+                break
+            common += 1
+        minimize(common)
+
+        node = unchecked[-1][2] if unchecked else root
+        for char in word[common:]:
+            child = DawgNode()
+            node.children[char] = child
+            unchecked.append((node, char, child))
+            node = child
+        node.final = True
+        previous = word
+    minimize(0)
+
+    set_counts(root)
+    return root
+
+
+def set_counts(root):
+    '''
+    Set the count of every state to the number of words below it, visiting
+    each shared state once.
+    '''
+    done = set()
+    stack = [(root, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if children_done:
+            node.count = int(node.final) + sum(
+                child.count for child in node.children.values())
+            done.add(id(node))
+        elif id(node) not in done:
+            stack.append((node, True))
+            for child in node.children.values():
+                if id(child) not in done:
+                    stack.append((child, False))
+
+
+def num_states(root):
+    '''
+    Number of distinct states reachable from root (including itself)
+    '''
+    seen = {id(root)}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        for child in node.children.values():
+            if id(child) not in seen:
+                seen.add(id(child))
+                stack.append(child)
+    return len(seen)
@@ -0,0 +1,201 @@
+# CS122: Auto-completing keyboard using Tries
+# Prebuilt, memory-mapped dictionary index
+#
+# Jake Underland
+#
+# Building the trie from a text word file takes seconds, so the shell
+# instead serializes the CompactTrie arrays into a binary index file once
+# and maps that file into memory on later runs. Lookups read the mapped
+# bytes directly through typed memoryviews; nothing is parsed at startup.
+#
+# File layout (native byte order; weights and max_weights are 8-byte
+# signed ints and come first, so that they are aligned, finals has one byte
+# per node and the other arrays are 4-byte unsigned ints):
+#
+#   header      magic, number of nodes, and the size, mtime and SHA-256 of
+#               the word file the index was built from
+#   weights     num_nodes entries
+#   max_weights num_nodes entries
+#   labels      num_nodes entries
+#   first_child num_nodes + 1 entries
+#   counts      num_nodes entries
+#   finals      num_nodes bytes
+#
+# Usage: python3 dictionary_index.py WORD_FILE [INDEX_FILE]
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+import word_file
+from compact_trie import CompactTrie
+
+MAGIC = b"CTRIE\x00\x02\x00"
+HEADER = struct.Struct("=8sQQq32s")
+INDEX_SUFFIX = ".idx"
+# (name, number of entries beyond num_nodes, format, item size) of each
+# array, in file order
+ARRAYS = (("weights", 0, "q", 8),
+          ("max_weights", 0, "q", 8),
+          ("labels", 0, "I", 4),
+          ("first_child", 1, "I", 4),
+          ("counts", 0, "I", 4),
+          ("finals", 0, "B", 1))
+
+
+def default_index_filename(wordfile):
+    '''
+    Name of the index file that goes with a word file
+    '''
+    return wordfile + INDEX_SUFFIX
+
+
+def file_digest(filename):
+    '''
+    SHA-256 digest of a file's contents
+    '''
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.digest()
+
+
+def build_index(wordfile, index_filename=None):
+    '''
+    Build a CompactTrie from a word file and serialize it to an index file,
+    stamped with the word file's size, mtime and digest.
+
+    Inputs:
+      wordfile (string): name of the file with the words.
+      index_filename (string): name of the index file (defaults to the word
+        file name plus INDEX_SUFFIX)
+
+    Returns: the CompactTrie that was written
+    '''
+    if index_filename is None:
+        index_filename = default_index_filename(wordfile)
+
+    st = os.stat(wordfile)
+    with open(wordfile) as f:
+        trie = CompactTrie.from_weighted_words(
+            word_file.read_weighted_words(f))
+
+    header = HEADER.pack(MAGIC, len(trie), st.st_size, st.st_mtime_ns,
+                         file_digest(wordfile))
+
+    # write to a temporary file and rename it, so a reader never sees a
+    # partially written index
+    tmp_filename = index_filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(header)
+        for name, _, _, _ in ARRAYS:
+            getattr(trie, name).tofile(f)
+    os.replace(tmp_filename, index_filename)
+
+    return trie
+
+
+def load_index(index_filename):
+    '''
+    Memory-map an index file.
+
+    Inputs:
+      index_filename (string): name of the index file
+
+    Returns: (CompactTrie, tuple) the trie, reading from the mapped file, and
+      the (size, mtime_ns, digest) stamp of the word file it was built from
+    '''
+    with open(index_filename, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapped) < HEADER.size:
+        magic = None
+    else:
+        magic, num_nodes, size, mtime_ns, digest = \
+            HEADER.unpack_from(mapped)
+    if magic != MAGIC or len(mapped) != HEADER.size + sum(
+            (num_nodes + extra) * itemsize
+            for _, extra, _, itemsize in ARRAYS):
+        mapped.close()
+        raise ValueError("%s is not a dictionary index" % index_filename)
+
+    view = memoryview(mapped)
+    offset = HEADER.size
+    arrays = {}
+    for name, extra, fmt, itemsize in ARRAYS:
+        nbytes = (num_nodes + extra) * itemsize
+        arrays[name] = view[offset:offset + nbytes].cast(fmt)
+        offset += nbytes
+
+    trie = CompactTrie(**arrays)
+    trie.mapped = mapped
+    return trie, (size, mtime_ns, digest)
+
+
+def is_stale(wordfile, stamp):
+    '''
+    Has the word file changed since the index with the given stamp was
+    built? The size and mtime are checked first; the contents are only
+    hashed if those differ (e.g. after a fresh checkout).
+    '''
+    size, mtime_ns, digest = stamp
+    st = os.stat(wordfile)
+    if st.st_size != size:
+        return True
+    if st.st_mtime_ns == mtime_ns:
+        return False
+    return file_digest(wordfile) != digest
+
+
+def open_index(wordfile, index_filename=None):
+    '''
+    Load the index for a word file, (re)building it first if it is missing,
+    unreadable or out of date. If the index cannot be written, the trie is
+    built in memory instead.
+
+    Inputs:
+      wordfile (string): name of the file with the words.
+      index_filename (string): name of the index file (defaults to the word
+        file name plus INDEX_SUFFIX)
+
+    Returns: CompactTrie
+    '''
+    if index_filename is None:
+        index_filename = default_index_filename(wordfile)
+
+    try:
+        trie, stamp = load_index(index_filename)
+    except (OSError, ValueError):
+        trie = None
+    if trie is not None:
+        try:
+            stale = is_stale(wordfile, stamp)
+        except OSError:
+            stale = True
+        if not stale:
+            return trie
+        # unmap the old index before the file is replaced
+        trie.close()
+
+    try:
+        build_index(wordfile, index_filename)
+    except OSError:
+        with open(wordfile) as f:
+            return CompactTrie.from_weighted_words(
+                word_file.read_weighted_words(f))
+
+    trie, _ = load_index(index_filename)
+    return trie
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python3 dictionary_index.py WORD_FILE [INDEX_FILE]")
+        sys.exit(1)
+
+    index_filename = sys.argv[2] if len(sys.argv) == 3 else None
+    trie = build_index(sys.argv[1], index_filename)
+    print("Wrote %d nodes (%d bytes)" % (len(trie), trie.nbytes()))
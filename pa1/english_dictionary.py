@@ -9,28 +9,129 @@
 #
 # Jake Underland
 
+import gc
+import heapq
+import itertools
 import os
 import sys
+import time
 from sys import exit
 
 import autocorrect_shell
+import dictionary_index
+import word_file
+from compact_trie import CompactTrie
+from dawg import build_dawg
+from symspell import SymSpellIndex
+
+# "trie" is the dict-of-nodes TrieNode below; "compact" stores the same trie
+# in flat arrays (see compact_trie.py), which is smaller but read-only;
+# "mmap" maps a prebuilt compact trie from an index file next to the word
+# file (see dictionary_index.py), rebuilding it when the word file changes;
+# "dawg" also merges common suffixes (see dawg.py), so it cannot store a
+# weight for each word and rejects word files that give weights.
+BACKENDS = ("trie", "compact", "mmap", "dawg")
+
+# Default number of completions returned by top_completions
+TOP_K = 10
+
+# Edit costs for fuzzy_versions. Substituting a key for one next to it on
+# the keyboard is the most likely typo, so it is cheaper.
+EDIT_COST = 1
+ADJACENT_KEY_COST = 0.5
+NEARBY_KEYS = {c: frozenset(autocorrect_shell.nearby_keys(c))
+               for c in autocorrect_shell.nearby_dict}
 
 
 class EnglishDictionary(object):
-    def __init__(self, wordfile):
+    def __init__(self, wordfile, backend="trie", spell_index=None):
         '''
         Constructor
 
         Inputs:
           wordfile (string): name of the file with the words.
+          backend (string): how to store the trie, one of BACKENDS.
+          spell_index (int): if given, also build a SymSpellIndex for
+            fuzzy_versions supporting this edit distance (see
+            build_spell_index).
+        '''
+        if backend not in BACKENDS:
+            raise ValueError("unknown backend %r, expected one of %s"
+                             % (backend, ", ".join(BACKENDS)))
+        self.backend = backend
+        if backend == "trie":
+            self.words = TrieNode()
+        else:
+            self.words = build_static(backend, [])
+        self.load_rate = None
+        self.spell_index = None
+        # weights set with set_weight/bump, for the "dawg" backend, which
+        # stores no weights (every other word weighs
+        # word_file.DEFAULT_WEIGHT)
+        self.weights = {}
+        self.load(wordfile)
+        if spell_index is not None:
+            self.build_spell_index(spell_index)
+
+    def load(self, wordfile):
+        '''
+        Bulk-load the words in a file into the dictionary, timing the load.
+
+        Inputs:
+          wordfile (string): name of the file with the words.
+
+        Returns: (int, float) the number of words added and the load rate
+          in words per second. The rate is also kept in self.load_rate.
+        '''
+        start = time.perf_counter()
+        if self.backend == "mmap" and self.words.count == 0:
+            self.words = dictionary_index.open_index(wordfile).root
+            num_words = self.words.count
+        else:
+            with open(wordfile) as f:
+                num_words = self.add_words(f)
+        elapsed = time.perf_counter() - start
+
+        self.load_rate = num_words / elapsed if elapsed > 0 else float("inf")
+        return num_words, self.load_rate
+
+    def add_words(self, words):
         '''
-        self.words = TrieNode()
+        Add every word in an iterable of lines in word file format (see
+        word_file.py), skipping blank lines and words already in the
+        dictionary. The "dawg" backend raises ValueError if a line gives a
+        weight other than word_file.DEFAULT_WEIGHT.
+
+        Inputs:
+          words (iterable of strings): the lines
+
+        Returns: int, the number of words added
+        '''
+        if self.backend != "trie":
+            # the other backends cannot grow in place, so rebuild them,
+            # keeping the weights of the words already there
+            num_before = self.words.count
+            entries = list(word_file.read_weighted_words(words))
+            if self.backend == "dawg":
+                old_entries = ((word, word_file.DEFAULT_WEIGHT)
+                               for word in self.words.iter_words())
+            else:
+                old_entries = self.words.trie.iter_weighted_words()
+            self.words = build_static(
+                self.backend, itertools.chain(old_entries, entries))
+            new_words = (word for word, _ in entries)
+            num_added = self.words.count - num_before
+        else:
+            entries = word_file.read_weighted_words(words)
+            if self.spell_index is not None:
+                entries = list(entries)
+            new_words = (word for word, _ in entries)
+            num_added = self.words.add_words(entries)
 
-        with open(wordfile) as f:
-            for w in f:
-                w = w.strip()
-                if w != "" and not self.is_word(w):
-                    self.words.add_word(w)
+        if self.spell_index is not None:
+            # so that fuzzy_versions suggests the new words too
+            self.spell_index.add(word for word in new_words if word)
+        return num_added
 
     def is_word(self, w):
         '''
@@ -41,10 +142,8 @@ class EnglishDictionary(object):
 
         Returns: boolean
         '''
-        try:
-            return self.words.traverse_nodes(w).final
-        except:  # word does not exist within self.words
-            return False
+        node = self.words.traverse_nodes(w)
+        return node is not None and node.final
 
     def num_completions(self, prefix):
         '''
@@ -56,11 +155,10 @@ class EnglishDictionary(object):
 
         Returns: int
         '''
-
-        try:
-            return self.words.traverse_nodes(prefix).count
-        except:  # prefix does not exist within self.words
+        node = self.words.traverse_nodes(prefix)
+        if node is None:  # prefix does not exist within self.words
             return 0
+        return node.count
 
     def get_completions(self, prefix):
         '''
@@ -72,8 +170,307 @@ class EnglishDictionary(object):
 
         Returns: list of strings.
         '''
-        return self.words.traverse_nodes(prefix).find_words()
+        node = self.words.traverse_nodes(prefix)
+        if node is None:
+            return []
+        return node.find_words()
+
+    def iter_completions(self, prefix, limit=None):
+        '''
+        Generate the suffixes in the dictionary of words that start with
+        the specified prefix, lazily, in the same order as get_completions.
+
+        Inputs:
+          prefix (string): the prefix
+          limit (int): stop after this many suffixes (None for all)
+
+        Yields strings.
+        '''
+        node = self.words.traverse_nodes(prefix)
+        if node is None:
+            return
+        yield from itertools.islice(node.iter_words(), limit)
+
+    def top_completions(self, prefix, k=TOP_K):
+        '''
+        Get the suffixes of the k words that start with the specified prefix
+        and have the highest frequency weight, ties broken alphabetically.
+
+        Inputs:
+          prefix (string): the prefix
+          k (int): the number of completions wanted
+
+        Returns: list of strings, best first
+        '''
+        node = self.words.traverse_nodes(prefix)
+        if node is None:
+            return []
+        if self.backend == "trie":
+            return [n.word[len(prefix):] for n in node.best_words(k)]
+        if self.backend != "dawg":
+            return node.best_words(k)
+
+        # Every word without an entry in self.weights has the default
+        # weight, so they rank alphabetically, which is the order iter_words
+        # generates them in for the DAWG; merge them with the (few)
+        # reweighted words.
+        reweighted = sorted((-weight, word[len(prefix):])
+                            for word, weight in self.weights.items()
+                            if word.startswith(prefix))
+        others = ((-word_file.DEFAULT_WEIGHT, suffix)
+                  for suffix in node.iter_words()
+                  if prefix + suffix not in self.weights)
+        ranked = heapq.merge(reweighted, others)
+        return [suffix for _, suffix in itertools.islice(ranked, k)]
+
+    def fuzzy_versions(self, word, max_edits=1):
+        '''
+        Find the words within an edit distance of word. Insertions,
+        deletions and substitutions cost EDIT_COST, except substituting a
+        letter for a key next to it on the keyboard, which costs
+        ADJACENT_KEY_COST.
+
+        The trie is walked keeping the row of the edit-distance table for
+        the path to each node, and branches whose row has no entry within
+        max_edits are pruned, since extending the path cannot make the
+        distance smaller.
+
+        Inputs:
+          word (string): the (possibly misspelled) word
+          max_edits (number): the largest total edit cost allowed
+
+        Returns: list of words (strings), closest first, ties broken
+          alphabetically
+        '''
+        # an adjacent-key substitution costs less than a plain edit, so
+        # max_edits may cover more plain edits than the index holds
+        if (self.spell_index is not None
+                and int(max_edits // ADJACENT_KEY_COST)
+                <= self.spell_index.max_distance):
+            return self.indexed_fuzzy_versions(word, max_edits)
+
+        # substitution cost of each letter of word for a given letter,
+        # computed once per letter seen on an edge
+        sub_costs = {}
+
+        def substitution_row(char):
+            costs = [substitution_cost(c, char) for c in word]
+            sub_costs[char] = costs
+            return costs
+
+        # A path of length depth lined up against the first i letters of
+        # word needs at least |depth - i| insertions or deletions, so only
+        # the cells within band of the diagonal can stay within max_edits.
+        n = len(word)
+        band = int(max_edits // EDIT_COST)
+        inf = float("inf")
+
+        matches = []
+        first_row = [i * EDIT_COST if i <= band else inf for i in range(n + 1)]
+        stack = [(self.words, "", first_row)]
+        while stack:
+            node, path, row = stack.pop()
+            if node.final and row[n] <= max_edits:
+                matches.append((row[n], path))
+
+            depth = len(path) + 1
+            lo = max(1, depth - band)
+            hi = min(n, depth + band)
+            for char, child in node.iter_children():
+                costs = sub_costs.get(char) or substitution_row(char)
+                new_row = [inf] * (n + 1)
+                if depth <= band:
+                    new_row[0] = depth * EDIT_COST
+                row_min = new_row[0]
+                for i in range(lo, hi + 1):
+                    # cheapest of substitution, deletion and insertion
+                    cost = row[i - 1] + costs[i - 1]
+                    if row[i] + EDIT_COST < cost:
+                        cost = row[i] + EDIT_COST
+                    if new_row[i - 1] + EDIT_COST < cost:
+                        cost = new_row[i - 1] + EDIT_COST
+                    new_row[i] = cost
+                    if cost < row_min:
+                        row_min = cost
+                if row_min <= max_edits:
+                    stack.append((child, path + char, new_row))
+
+        matches.sort()
+        return [w for _, w in matches]
+
+    def cursor(self):
+        '''
+        Get a PrefixCursor at the empty prefix, for looking up a word one
+        letter at a time.
+        '''
+        return PrefixCursor(self.words)
+
+    def build_spell_index(self, max_distance=2, prefix_length=7):
+        '''
+        Build a SymSpellIndex of the dictionary words, which fuzzy_versions
+        then uses for any max_edits up to max_distance * ADJACENT_KEY_COST
+        (the most plain edits max_edits can pay for is max_edits /
+        ADJACENT_KEY_COST). The index holds
+        every string obtained by deleting up to max_distance letters from
+        (the first prefix_length letters of) each word, so it is large:
+        see its memory_report.
+
+        Inputs:
+          max_distance (int): the largest edit distance the index supports
+          prefix_length (int): letters of each word used for deletions
+
+        Returns: the SymSpellIndex
+        '''
+        self.spell_index = SymSpellIndex(self.words.iter_words(),
+                                         max_distance, prefix_length)
+        return self.spell_index
+
+    def indexed_fuzzy_versions(self, word, max_edits):
+        '''
+        fuzzy_versions using the spell index. The index finds the words
+        within a plain (unweighted) edit distance, which are then ranked by
+        the weighted cost. Since an adjacent-key substitution costs
+        ADJACENT_KEY_COST, a word within max_edits of weighted cost may be
+        up to max_edits / ADJACENT_KEY_COST plain edits away; candidates
+        beyond the index's max_distance are missed, so fuzzy_versions only
+        uses the index when there are none.
+        '''
+        max_distance = min(self.spell_index.max_distance,
+                           int(max_edits // ADJACENT_KEY_COST))
+        words = self.spell_index.words
+        sub_costs = {}
+        matches = []
+        for i in self.spell_index.candidates(word, max_distance):
+            cost = weighted_edit_distance(word, words[i], max_edits,
+                                          sub_costs)
+            if cost <= max_edits:
+                matches.append((cost, words[i]))
+        matches.sort()
+        return [w for _, w in matches]
+
+    def get_weight(self, word):
+        '''
+        Get the frequency weight of a word (None if it is not a word).
+        '''
+        node = self.words.traverse_nodes(word)
+        if node is None or not node.final:
+            return None
+        if self.backend != "dawg":
+            return node.weight
+        return self.weights.get(word, word_file.DEFAULT_WEIGHT)
+
+    def set_weight(self, word, weight):
+        '''
+        Set the frequency weight used by top_completions for a word.
+
+        Inputs:
+          word (string): a word in the dictionary
+          weight (int): its weight
+
+        Returns: boolean, whether the word was found
+        '''
+        if self.backend != "dawg":
+            return self.words.set_weight(word, weight)
+        if not self.is_word(word):
+            return False
+        self.weights[word] = weight
+        return True
+
+    def bump(self, word, amount=1):
+        '''
+        Increase the weight of a word, e.g. each time it is used, so that
+        top_completions learns which words are likely.
+
+        Inputs:
+          word (string): a word in the dictionary
+          amount (int): how much to add to its weight
+
+        Returns: boolean, whether the word was found
+        '''
+        weight = self.get_weight(word)
+        if weight is None:
+            return False
+        return self.set_weight(word, weight + amount)
+
+
+
+class PrefixCursor(object):
+    '''
+    A prefix that is typed one letter at a time. The cursor keeps the trie
+    node for every prefix of the current one, so adding or removing a
+    letter is a single step instead of a traversal from the root.
+    '''
+
+    def __init__(self, root):
+        '''
+        Constructor
+
+        Inputs:
+          root: the root node of the trie (TrieNode or CompactTrieNode)
+        '''
+        self.root = root
+        self.reset()
+
+    def reset(self):
+        '''
+        Go back to the empty prefix
+        '''
+        # path[i] is the node for the first i letters, or None once the
+        # prefix has left the trie
+        self.path = [self.root]
+        self.chars = []
+
+    @property
+    def prefix(self):
+        return "".join(self.chars)
+
+    def push(self, char):
+        '''
+        Add a letter to the end of the prefix
+        '''
+        node = self.path[-1]
+        if node is not None:
+            node = node.traverse_nodes(char)
+        self.path.append(node)
+        self.chars.append(char)
+
+    def pop(self):
+        '''
+        Remove the last letter of the prefix, if any
+        '''
+        if self.chars:
+            self.path.pop()
+            self.chars.pop()
+
+    @property
+    def count(self):
+        '''
+        Number of words starting with the prefix
+        '''
+        node = self.path[-1]
+        return 0 if node is None else node.count
+
+    def is_word(self):
+        '''
+        Is the prefix a word?
+        '''
+        node = self.path[-1]
+        return node is not None and node.final
+
+    def completions(self, limit=None):
+        '''
+        Get the suffixes of the words that start with the prefix, in the
+        same order as EnglishDictionary.get_completions.
+
+        Inputs:
+          limit (int): return at most this many (None for all)
 
+        Returns: list of strings
+        '''
+        node = self.path[-1]
+        if node is None:
+            return []
+        return list(itertools.islice(node.iter_words(), limit))
 
 
 class TrieNode(object):
@@ -84,37 +481,146 @@ class TrieNode(object):
         self.children = {} # keys will be letters, values the node class
         self.count = 0
         self.final = False
+        self.word = None  # the word ending at this node, if final
+        self.weight = 0  # frequency weight of that word
+        self.max_weight = 0  # largest weight of a word at or below the node
 
-    def add_word(self, word):
+    def add_word(self, word, weight=word_file.DEFAULT_WEIGHT):
         '''
         Adds word to a node, creating a node for each letter in the word.
+        Walks the word by index, so there is no recursion or slicing and
+        words of any length can be added. A word that is already present
+        is detected during the same walk and left alone.
 
         Inputs:
           word (string): The word
+          weight (int): frequency weight of the word
+
+        Returns: boolean, whether the word was new
+        '''
+        path = [self]
+        node = self
+        for char in word:
+            child = node.children.get(char)
+            if child is None:  # new letter, create new node
+                child = TrieNode()
+                node.children[char] = child
+            node = child
+            path.append(node)
+
+        if node.final:  # duplicate
+            return False
+
+        # only count the word once we know it is new
+        for n in path:
+            n.count += 1
+            if weight > n.max_weight:
+                n.max_weight = weight
+        node.final = True
+        node.word = word
+        node.weight = weight
+        return True
+
+    def add_words(self, words):
         '''
-        self.count += 1
-        if not word:  # base case. No more letters indicates end of word
-            self.final = True
+        Adds every word in an iterable, skipping empty strings and words
+        already present.
 
-        else:  # recursive case. If new letter, create new node.
-            if not self.children.get(word[0]):
-                self.children[word[0]] = TrieNode()
-            self.children[word[0]].add_word(word[1:])
+        Inputs:
+          words (iterable of (string, int) pairs): the words and their
+            weights
+
+        Returns: int, the number of words added
+        '''
+        num_words = 0
+        previous = None
+        # Most of the time spent creating hundreds of thousands of nodes is
+        # the cyclic garbage collector repeatedly scanning them, although
+        # the trie has no cycles, so it is paused during the load.
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for word, weight in words:
+                # in sorted input duplicates are adjacent, which is caught
+                # without walking the trie
+                if word == "" or word == previous:
+                    continue
+                previous = word
+                if self.add_word(word, weight):
+                    num_words += 1
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return num_words
+
+    def set_weight(self, word, weight):
+        '''
+        Change the frequency weight of a word already in self.
+
+        Inputs:
+          word (string): the word
+          weight (int): its new weight
+
+        Returns: boolean, whether word was found
+        '''
+        path = [self]
+        for char in word:
+            node = path[-1].children.get(char)
+            if node is None:
+                return False
+            path.append(node)
+        if not path[-1].final:
+            return False
+
+        path[-1].weight = weight
+        # the bounds along the path may have changed in either direction
+        for node in reversed(path):
+            node.max_weight = max(
+                [node.weight if node.final else 0]
+                + [child.max_weight for child in node.children.values()])
+        return True
 
     def traverse_nodes(self, word):
         '''
-        Of a word already in self, navigates to the node of the last letter in 
-        the word. 
-        
+        Navigates to the node of the last letter in the word.
+
         Inputs:
-          word (string): the word. Must already be within self.
+          word (string): the word (or prefix)
 
-        Returns the TrieNode object for the last letter in word
+        Returns the TrieNode object for the last letter in word, or None if
+        word is not a path within self.
         '''
-        if not word:
-            return self
-        else:
-            return self.children[word[0]].traverse_nodes(word[1:])
+        node = self
+        for char in word:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def iter_children(self):
+        '''
+        Generates (letter, child node) pairs for the node's children.
+        '''
+        return iter(self.children.items())
+
+    def iter_words(self, prefix=""):
+        '''
+        Generates the complete words found under a given node, one at a
+        time, without building the full list.
+
+        Inputs:
+          prefix (string): prepended to every word generated.
+
+        Yields words (strings) under the node.
+        '''
+        stack = [(self, prefix)]
+        while stack:
+            node, path = stack.pop()
+            if node.final:
+                yield path
+            # push in reverse so children are visited in insertion order
+            for char, child in reversed(node.children.items()):
+                stack.append((child, path + char))
 
     def find_words(self, prefix=""):
         '''
@@ -126,13 +632,122 @@ class TrieNode(object):
         
         Returns a list of words (strings) under the node. 
         '''
+        return list(self.iter_words(prefix))
+
+    def best_words(self, k):
+        '''
+        The k words under the node with the highest weight, ties broken
+        alphabetically.
+
+        This is a best-first branch-and-bound search: a subtree is only
+        opened when its max_weight (an upper bound on every weight inside
+        it) could still beat the words already found, so typically only
+        the paths to the k answers are visited.
+
+        Inputs:
+          k (int): number of words wanted
+
+        Returns: list of the final TrieNodes, best first
+        '''
+        # Entries are (-weight, string, kind, sequence number, node). For a
+        # subtree, weight is its bound and string its path: every word in
+        # it is at least as long and sorts after the path, so it can never
+        # beat an entry that sorts before the subtree's own entry. Words
+        # (kind 0) come before subtrees (kind 1) on ties.
+        heap = [(-self.max_weight, "", 1, 0, self)]
+        sequence = 1
+        best = []
+        while heap and len(best) < k:
+            _, path, kind, _, node = heapq.heappop(heap)
+            if kind == 0:
+                best.append(node)
+                continue
+            if node.final:
+                heapq.heappush(heap, (-node.weight, path, 0, sequence, node))
+                sequence += 1
+            for char, child in node.children.items():
+                heapq.heappush(heap, (-child.max_weight, path + char, 1,
+                                      sequence, child))
+                sequence += 1
+        return best
+
+
+def build_static(backend, entries):
+    '''
+    Build the root node for one of the backends that cannot be added to
+    (everything but "trie"), in memory.
+
+    Inputs:
+      backend (string): one of BACKENDS
+      entries (iterable of (string, int) pairs): the words and their
+        weights
+
+    Returns: the root node
+    '''
+    if backend == "dawg":
         words = []
-        if self.final:
-            words.append(prefix)
-        for child_char, child in self.children.items():
-            words += child.find_words(prefix + child_char)
+        for word, weight in entries:
+            if weight != word_file.DEFAULT_WEIGHT:
+                raise ValueError("the dawg backend cannot store the weight "
+                                 "of %r" % word)
+            words.append(word)
+        return build_dawg(words)
+    return CompactTrie.from_weighted_words(entries).root
+
+
+def substitution_cost(typed, intended):
+    '''
+    Cost of the letter intended having been typed as typed
+    '''
+    if typed == intended:
+        return 0
+    if typed.lower() in NEARBY_KEYS.get(intended.lower(), ()):
+        return ADJACENT_KEY_COST
+    return EDIT_COST
+
+
+def weighted_edit_distance(typed, word, max_cost, sub_costs=None):
+    '''
+    Edit distance from typed to word, with the costs used by
+    fuzzy_versions, giving up (and returning infinity) once it is known to
+    exceed max_cost.
+
+    sub_costs is an optional dictionary caching, for each letter, the cost
+    of substituting it for each letter of typed; pass the same one when
+    comparing typed against many words.
+    '''
+    n = len(typed)
+    band = int(max_cost // EDIT_COST)
+    inf = float("inf")
+    if abs(n - len(word)) > band:
+        return inf
+    if sub_costs is None:
+        sub_costs = {}
+
+    row = [i * EDIT_COST if i <= band else inf for i in range(n + 1)]
+    for depth, char in enumerate(word, 1):
+        costs = sub_costs.get(char)
+        if costs is None:
+            costs = [substitution_cost(c, char) for c in typed]
+            sub_costs[char] = costs
+        new_row = [inf] * (n + 1)
+        if depth <= band:
+            new_row[0] = depth * EDIT_COST
+        row_min = new_row[0]
+        for i in range(max(1, depth - band), min(n, depth + band) + 1):
+            cost = row[i - 1] + costs[i - 1]
+            if row[i] + EDIT_COST < cost:
+                cost = row[i] + EDIT_COST
+            if new_row[i - 1] + EDIT_COST < cost:
+                cost = new_row[i - 1] + EDIT_COST
+            new_row[i] = cost
+            if cost < row_min:
+                row_min = cost
+        if row_min > max_cost:
+            return inf
+        row = new_row
+    return row[n]
 
-        return words
 
 if __name__ == "__main__":
-    autocorrect_shell.go("english_dictionary")
+    autocorrect_shell.go("english_dictionary", backend="mmap")
@@ -23,12 +23,16 @@ class EnglishDictionary(object):
           wordfile (string): name of the file with the words.
         '''
         self.words = []
+        # the same words as a set, so that checking for duplicates while
+        # loading (and is_word) does not scan the list
+        self.word_set = set()
 
         with open(wordfile) as f:
             for w in f:
                 w = w.strip()
-                if w != "" and not self.is_word(w):
+                if w != "" and w not in self.word_set:
                     self.words.append(w)
+                    self.word_set.add(w)
 
     def is_word(self, w):
         '''
@@ -39,7 +43,7 @@ class EnglishDictionary(object):
 
         Returns: boolean
         '''
-        return (w in self.words)
+        return (w in self.word_set)
 
     def num_completions(self, prefix):
         '''
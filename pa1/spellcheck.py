@@ -0,0 +1,204 @@
+# CS122: Auto-completing keyboard using Tries
+# Batch spell checking of whole documents
+#
+# Jake Underland
+#
+# Usage: python3 spellcheck.py [-j WORKERS] WORD_FILE FILE [FILE ...]
+#
+# Prints one line per misspelled word:
+#
+#   FILE:LINE:COLUMN: WORD (SUGGESTION, SUGGESTION, ...)
+
+import argparse
+import collections
+import concurrent.futures
+import functools
+import itertools
+import re
+import sys
+
+import english_dictionary
+
+WORD_RE = re.compile(r"[A-Za-z]+")
+MAX_SUGGESTIONS = 5
+CACHE_SIZE = 100000
+# number of lines handed to a worker process at a time
+CHUNK_LINES = 2000
+
+Misspelling = collections.namedtuple(
+    "Misspelling", ["line", "column", "word", "suggestions"])
+
+
+class SpellChecker(object):
+    def __init__(self, eng_dict, max_edits=1, max_suggestions=MAX_SUGGESTIONS,
+                 cache_size=CACHE_SIZE):
+        '''
+        Constructor
+
+        Inputs:
+          eng_dict (EnglishDictionary): the dictionary
+          max_edits (number): edit budget for suggestions (see
+            EnglishDictionary.fuzzy_versions)
+          max_suggestions (int): number of suggestions kept per word
+          cache_size (int): number of distinct tokens whose result is
+            remembered
+        '''
+        self.eng_dict = eng_dict
+        self.max_edits = max_edits
+        self.max_suggestions = max_suggestions
+        # documents repeat the same words constantly, so the result for
+        # each token is cached
+        self.check_word = functools.lru_cache(maxsize=cache_size)(
+            self.check_uncached)
+
+    def check_uncached(self, word):
+        '''
+        Check a single word. A capitalized word (at the start of a
+        sentence, say) is also accepted if its lowercase form is a word.
+
+        Returns: None if the word is spelled correctly, otherwise a tuple of
+          suggested corrections (possibly empty), best first
+        '''
+        if self.eng_dict.is_word(word):
+            return None
+        lower = word.lower()
+        if lower != word and self.eng_dict.is_word(lower):
+            return None
+
+        suggestions = self.eng_dict.fuzzy_versions(lower, self.max_edits)
+        return tuple(suggestions[:self.max_suggestions])
+
+    def check_lines(self, lines, first_line=1):
+        '''
+        Check an iterable of lines of text.
+
+        Inputs:
+          lines (iterable of strings): the text
+          first_line (int): line number of the first line
+
+        Yields a Misspelling for each misspelled word, in order
+        '''
+        for line_number, line in enumerate(lines, first_line):
+            for match in WORD_RE.finditer(line):
+                suggestions = self.check_word(match.group())
+                if suggestions is not None:
+                    yield Misspelling(line_number, match.start() + 1,
+                                      match.group(), suggestions)
+
+
+def check_text(eng_dict, text, max_edits=1):
+    '''
+    Check a string of text.
+
+    Inputs:
+      eng_dict (EnglishDictionary): the dictionary
+      text (string): the text
+      max_edits (number): edit budget for suggestions
+
+    Returns: list of Misspellings
+    '''
+    checker = SpellChecker(eng_dict, max_edits)
+    return list(checker.check_lines(text.splitlines()))
+
+
+def check_file(eng_dict, filename, max_edits=1):
+    '''
+    Check a text file, reading it a line at a time.
+
+    Inputs:
+      eng_dict (EnglishDictionary): the dictionary
+      filename (string): name of the file to check
+      max_edits (number): edit budget for suggestions
+
+    Yields a Misspelling for each misspelled word, in order
+    '''
+    checker = SpellChecker(eng_dict, max_edits)
+    with open(filename, errors="replace") as f:
+        yield from checker.check_lines(f)
+
+
+### Parallel checking. Each worker process loads its own dictionary (cheap
+### with the memory-mapped index) and keeps its own token cache.
+
+_worker_checker = None
+
+
+def _init_worker(wordfile, max_edits):
+    global _worker_checker
+    eng_dict = english_dictionary.EnglishDictionary(wordfile, backend="mmap")
+    _worker_checker = SpellChecker(eng_dict, max_edits)
+
+
+def _check_chunk(lines, first_line):
+    return list(_worker_checker.check_lines(lines, first_line))
+
+
+def check_file_parallel(wordfile, filename, workers, max_edits=1,
+                        chunk_lines=CHUNK_LINES):
+    '''
+    Check a text file with a pool of worker processes. The file is read in
+    chunks of lines and only a few chunks per worker are in flight at once,
+    so memory stays bounded however large the file is; results are
+    yielded in file order as soon as they are ready.
+
+    Inputs:
+      wordfile (string): name of the file with the dictionary words
+      filename (string): name of the file to check
+      workers (int): number of worker processes
+      max_edits (number): edit budget for suggestions
+      chunk_lines (int): number of lines per task
+
+    Yields a Misspelling for each misspelled word, in order
+    '''
+    # build the index once up front rather than racing in every worker
+    english_dictionary.EnglishDictionary(wordfile, backend="mmap")
+
+    with concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=_init_worker,
+            initargs=(wordfile, max_edits)) as pool, \
+            open(filename, errors="replace") as f:
+        pending = collections.deque()
+        first_line = 1
+        while True:
+            lines = list(itertools.islice(f, chunk_lines))
+            if lines:
+                pending.append(pool.submit(_check_chunk, lines, first_line))
+                first_line += len(lines)
+            # wait for the oldest chunk once enough are queued (or the
+            # file is exhausted)
+            while pending and (not lines or len(pending) >= 2 * workers):
+                yield from pending.popleft().result()
+            if not lines:
+                break
+
+
+def print_misspellings(filename, misspellings, out=sys.stdout):
+    '''
+    Write misspellings in FILE:LINE:COLUMN: WORD (SUGGESTIONS) format
+    '''
+    for m in misspellings:
+        out.write("%s:%d:%d: %s (%s)\n" % (filename, m.line, m.column,
+                                            m.word, ", ".join(m.suggestions)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="List the misspelled words in text files.")
+    parser.add_argument("wordfile", metavar="WORD_FILE")
+    parser.add_argument("files", metavar="FILE", nargs="+")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of worker processes (default 1)")
+    parser.add_argument("-e", "--max-edits", type=float, default=1,
+                        help="edit budget for suggestions (default 1)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        for filename in args.files:
+            print_misspellings(filename, check_file_parallel(
+                args.wordfile, filename, args.workers, args.max_edits))
+    else:
+        eng_dict = english_dictionary.EnglishDictionary(args.wordfile,
+                                                        backend="mmap")
+        for filename in args.files:
+            print_misspellings(filename, check_file(eng_dict, filename,
+                                                    args.max_edits))
@@ -0,0 +1,186 @@
+# CS122: Auto-completing keyboard using Tries
+# Symmetric-delete spelling correction index
+#
+# Jake Underland
+#
+# Two words are within edit distance k of each other only if deleting at
+# most k letters from each gives a common string. So if we precompute,
+# for every dictionary word, all the strings obtained by deleting up to
+# max_distance letters (its deletion neighborhood), a query only has to
+# generate its own deletion neighborhood and look each string up: the
+# words found are the candidates, which are then checked with a real
+# edit-distance computation. The cost of a query depends on the length of
+# the query, not the size of the dictionary.
+#
+# As in SymSpell, only the first prefix_length letters of each word are
+# used to generate deletions, which bounds the size of the index for long
+# words; candidates are still verified against the full word.
+
+import sys
+
+
+class SymSpellIndex(object):
+    def __init__(self, words, max_distance=2, prefix_length=7):
+        '''
+        Constructor
+
+        Inputs:
+          words (iterable of strings): the dictionary words
+          max_distance (int): the largest edit distance lookup supports
+          prefix_length (int): number of letters of each word used to
+            generate deletions
+        '''
+        if max_distance < 0 or prefix_length <= max_distance:
+            raise ValueError("need 0 <= max_distance < prefix_length")
+
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        # sorted, followed by the words added later in the order they
+        # were added
+        self.words = []
+
+        # maps each deletion string to the index of the word it came from,
+        # or a list of indices if it came from several words
+        self.deletes = {}
+        for word in sorted(set(words)):
+            self.add_deletions(word)
+
+    def add_deletions(self, word):
+        i = len(self.words)
+        self.words.append(word)
+        for d in deletions(word[:self.prefix_length], self.max_distance):
+            entry = self.deletes.get(d)
+            if entry is None:
+                self.deletes[d] = i
+            elif isinstance(entry, list):
+                entry.append(i)
+            else:
+                self.deletes[d] = [entry, i]
+
+    def add(self, words):
+        '''
+        Add words to the index (skipping those already in it)
+
+        Inputs:
+          words (iterable of strings): the words
+
+        Returns: int, the number of words added
+        '''
+        num_added = 0
+        for word in words:
+            # a word in the index is among the words of its own prefix
+            entry = self.deletes.get(word[:self.prefix_length])
+            if entry is None:
+                entry = []
+            elif not isinstance(entry, list):
+                entry = [entry]
+            if all(self.words[i] != word for i in entry):
+                self.add_deletions(word)
+                num_added += 1
+        return num_added
+
+    def candidates(self, word, max_distance):
+        '''
+        Indices of the words that share a deletion string with word
+        '''
+        found = set()
+        for d in deletions(word[:self.prefix_length], max_distance):
+            entry = self.deletes.get(d)
+            if entry is None:
+                continue
+            if isinstance(entry, list):
+                found.update(entry)
+            else:
+                found.add(entry)
+        return found
+
+    def lookup(self, word, max_distance=None):
+        '''
+        Find the dictionary words within an edit distance of word.
+
+        Inputs:
+          word (string): the (possibly misspelled) word
+          max_distance (int): the largest edit distance allowed, at most
+            the index's max_distance (the default)
+
+        Returns: list of (distance, word) pairs, closest first, ties broken
+          alphabetically
+        '''
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            raise ValueError("the index only supports distances up to %d"
+                             % self.max_distance)
+
+        matches = []
+        for i in self.candidates(word, max_distance):
+            candidate = self.words[i]
+            distance = edit_distance(word, candidate, max_distance)
+            if distance <= max_distance:
+                matches.append((distance, candidate))
+        matches.sort()
+        return matches
+
+    def memory_report(self):
+        '''
+        Estimate the memory held by the index.
+
+        Returns: dictionary with the number of words and deletion strings,
+          and the bytes used by the words, the deletion strings, the
+          posting lists and the hash table itself.
+        '''
+        words_bytes = sys.getsizeof(self.words) + sum(
+            sys.getsizeof(w) for w in self.words)
+        keys_bytes = sum(sys.getsizeof(d) for d in self.deletes)
+        postings_bytes = sum(sys.getsizeof(entry) for entry
+                             in self.deletes.values()
+                             if isinstance(entry, list))
+        table_bytes = sys.getsizeof(self.deletes)
+
+        return {"words": len(self.words),
+                "deletes": len(self.deletes),
+                "words_bytes": words_bytes,
+                "keys_bytes": keys_bytes,
+                "postings_bytes": postings_bytes,
+                "table_bytes": table_bytes,
+                "total_bytes": (words_bytes + keys_bytes + postings_bytes
+                                + table_bytes)}
+
+
+def deletions(word, max_distance):
+    '''
+    The set of strings obtained by deleting at most max_distance letters
+    from word (including word itself).
+    '''
+    found = {word}
+    frontier = [word]
+    for _ in range(max_distance):
+        next_frontier = []
+        for w in frontier:
+            for i in range(len(w)):
+                d = w[:i] + w[i + 1:]
+                if d not in found:
+                    found.add(d)
+                    next_frontier.append(d)
+        frontier = next_frontier
+    return found
+
+
+def edit_distance(a, b, max_distance):
+    '''
+    Levenshtein distance between a and b, giving up early once it is known
+    to exceed max_distance (in which case max_distance + 1 is returned).
+    '''
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        new_row = [i]
+        for j, cb in enumerate(b, 1):
+            new_row.append(min(row[j] + 1, new_row[j - 1] + 1,
+                               row[j - 1] + (ca != cb)))
+        if min(new_row) > max_distance:
+            return max_distance + 1
+        row = new_row
+    return min(row[-1], max_distance + 1)
@@ -0,0 +1,133 @@
+# CS122: Auto-completing keyboard using Tries
+# Tests: every backend answers like the trie
+#
+# Jake Underland
+#
+# Run with: python3 -m pytest test_backends.py
+
+import pytest
+
+import dawg
+from english_dictionary import BACKENDS, EnglishDictionary
+
+# words sharing prefixes and suffixes, which the compact trie and the DAWG
+# store differently from the trie
+WORDS = ["a", "an", "and", "ant", "talk", "talked", "talking", "walk",
+         "walked", "walking", "stalk", "stalking", "zebra", "zebras"]
+PREFIXES = ["", "a", "an", "tal", "talking", "walk", "st", "x", "zebrass"]
+TYPOS = ["tslk", "walkin", "zebr", "anr", "q"]
+# a word file with frequencies, in which the ranking differs from the
+# alphabetical order
+WEIGHTED = ["the\t1000", "they\t50", "them\t500", "there\t800", "then",
+            "a\t7", "an\t7", "and\t900", "ant\t3", "talk\t40",
+            "talking\t40", "walk\t41", "zebra\t0"]
+WEIGHTED_PREFIXES = ["", "t", "th", "the", "them", "a", "an", "walk",
+                     "zebra", "x"]
+
+
+def make_dictionary(tmp_path, words, backend):
+    wordfile = tmp_path / "words"
+    wordfile.write_text("".join(w + "\n" for w in words))
+    # the mmap backend writes its index next to the word file
+    return EnglishDictionary(str(wordfile), backend=backend)
+
+
+def answers(eng_dict, prefixes, typos):
+    return {"is_word": [eng_dict.is_word(p) for p in prefixes],
+            "num": [eng_dict.num_completions(p) for p in prefixes],
+            "completions": [sorted(eng_dict.get_completions(p))
+                            for p in prefixes],
+            "fuzzy": [eng_dict.fuzzy_versions(t, 1) for t in typos],
+            "top": [eng_dict.top_completions(p, 3) for p in prefixes],
+            "weight": [eng_dict.get_weight(p) for p in prefixes]}
+
+
+@pytest.mark.parametrize("backend", [b for b in BACKENDS if b != "trie"])
+@pytest.mark.parametrize("words", [WORDS, [], ["solo"]],
+                         ids=["words", "empty", "single"])
+def test_backend_matches_trie(tmp_path, backend, words):
+    trie = make_dictionary(tmp_path, words, "trie")
+    other = make_dictionary(tmp_path, words, backend)
+    assert answers(other, PREFIXES + words, TYPOS) == \
+        answers(trie, PREFIXES + words, TYPOS)
+
+
+@pytest.mark.parametrize("backend", [b for b in BACKENDS if b != "trie"])
+def test_add_words_matches_trie(tmp_path, backend):
+    trie = make_dictionary(tmp_path, WORDS[:5], "trie")
+    other = make_dictionary(tmp_path, WORDS[:5], backend)
+    for eng_dict in (trie, other):
+        eng_dict.add_words(w + "\n" for w in WORDS[5:] + ["an"])
+    assert answers(other, PREFIXES, TYPOS) == answers(trie, PREFIXES, TYPOS)
+
+
+# typos whose closest words are up to twice as many plain edits away as
+# their weighted cost, since adjacent-key substitutions cost half an edit
+SPELL_WORDS = WORDS + ["sado", "Sanjay", "asyla", "asylum"]
+SPELL_TYPOS = TYPOS + ["zaep", "Sanhat", "Tammay", "aayla", "aatta", "sdo",
+                       "tslkinh"]
+
+
+@pytest.mark.parametrize("max_distance", [1, 2, 3])
+def test_spell_index_matches_walk(tmp_path, max_distance):
+    walk = make_dictionary(tmp_path, SPELL_WORDS, "trie")
+    indexed = make_dictionary(tmp_path, SPELL_WORDS, "trie")
+    indexed.build_spell_index(max_distance)
+    for max_edits in [0, 0.5, 1, 1.5, 2, max_distance]:
+        for typo in SPELL_TYPOS + SPELL_WORDS:
+            assert indexed.fuzzy_versions(typo, max_edits) == \
+                walk.fuzzy_versions(typo, max_edits)
+
+
+def test_spell_index_too_small_falls_back_to_walk(tmp_path):
+    eng_dict = make_dictionary(tmp_path, SPELL_WORDS, "trie")
+    walk = eng_dict.fuzzy_versions("Sanhat", 1)
+    assert "Sanjay" in walk
+    eng_dict.build_spell_index(1)
+    # "Sanjay" is 2 plain edits away, beyond an index of distance 1
+    assert "Sanjay" not in eng_dict.indexed_fuzzy_versions("Sanhat", 1)
+    assert eng_dict.fuzzy_versions("Sanhat", 1) == walk
+
+
+@pytest.mark.parametrize("backend", [b for b in BACKENDS
+                                     if b not in ("trie", "dawg")])
+def test_weights_match_trie(tmp_path, backend):
+    trie = make_dictionary(tmp_path, WEIGHTED, "trie")
+    other = make_dictionary(tmp_path, WEIGHTED, backend)
+    assert trie.top_completions("the", 3) == ["", "re", "m"]
+    assert answers(other, WEIGHTED_PREFIXES, TYPOS) == \
+        answers(trie, WEIGHTED_PREFIXES, TYPOS)
+
+    # learned weights, then words added after them
+    for eng_dict in (trie, other):
+        assert eng_dict.bump("they", 2000)
+        assert eng_dict.set_weight("and", 1)
+        assert not eng_dict.bump("th")
+        eng_dict.add_words(["thee\t600\n", "the\t5\n", "zebras\n"])
+    assert trie.top_completions("the", 4) == ["y", "", "re", "e"]
+    assert answers(other, WEIGHTED_PREFIXES + ["thee"], TYPOS) == \
+        answers(trie, WEIGHTED_PREFIXES + ["thee"], TYPOS)
+
+
+def test_dawg_rejects_weights(tmp_path):
+    with pytest.raises(ValueError):
+        make_dictionary(tmp_path, WEIGHTED, "dawg")
+    eng_dict = make_dictionary(tmp_path, WORDS, "dawg")
+    with pytest.raises(ValueError):
+        eng_dict.add_words(["zebu\t3\n"])
+    eng_dict.add_words(["zebu\n"])
+    assert eng_dict.is_word("zebu")
+
+
+def test_dawg_merges_suffixes():
+    root = dawg.build_dawg(sorted(WORDS))
+    assert sorted(root.find_words()) == sorted(WORDS)
+    assert root.count == len(WORDS)
+    # "alk", "alked" and "alking" are shared by talk, walk and stalk
+    assert dawg.num_states(root) < sum(len(w) for w in WORDS)
+
+
+def test_dawg_empty():
+    root = dawg.build_dawg([])
+    assert root.find_words() == []
+    assert root.count == 0
@@ -0,0 +1,76 @@
+# CS122: Auto-completing keyboard using Tries
+# Tests: the memory-mapped dictionary index
+#
+# Jake Underland
+#
+# Run with: python3 -m pytest test_dictionary_index.py
+
+import os
+
+import pytest
+
+import dictionary_index
+
+
+def write_words(path, words):
+    path.write_text("".join(w + "\n" for w in words))
+
+
+def test_round_trip(tmp_path):
+    wordfile = tmp_path / "words"
+    write_words(wordfile, ["a\t3", "an", "and\t9", "b\t4"])
+    trie = dictionary_index.open_index(str(wordfile))
+    assert trie.mapped is not None
+    assert trie.root.find_words() == ["a", "an", "and", "b"]
+    assert trie.root.traverse_nodes("an").count == 2
+    assert trie.root.traverse_nodes("an").weight == 1
+    assert trie.root.traverse_nodes("an").max_weight == 9
+    assert trie.root.best_words(3) == ["and", "b", "a"]
+    trie.close()
+    assert trie.mapped is None
+
+
+def test_stale_index_is_closed_and_rebuilt(tmp_path, monkeypatch):
+    wordfile = tmp_path / "words"
+    write_words(wordfile, ["a", "an"])
+    dictionary_index.build_index(str(wordfile))
+    write_words(wordfile, ["a", "an", "and"])
+    os.utime(wordfile, ns=(0, 0))
+
+    loaded = []
+    load_index = dictionary_index.load_index
+
+    def recording_load_index(filename):
+        trie, stamp = load_index(filename)
+        loaded.append(trie)
+        return trie, stamp
+
+    monkeypatch.setattr(dictionary_index, "load_index", recording_load_index)
+    trie = dictionary_index.open_index(str(wordfile))
+    assert trie.root.find_words() == ["a", "an", "and"]
+    # the stale index was unmapped before the file was replaced
+    assert [t.mapped is None for t in loaded] == [True, False]
+    trie.close()
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: b"",
+    lambda data: data[:dictionary_index.HEADER.size - 1],
+    lambda data: b"XTRIE" + data[5:],
+    lambda data: data[:-1]],
+    ids=["empty", "short header", "magic", "truncated"])
+def test_corrupt_index_is_rejected_and_rebuilt(tmp_path, corrupt):
+    wordfile = tmp_path / "words"
+    write_words(wordfile, ["a", "an", "and"])
+    index_filename = dictionary_index.default_index_filename(str(wordfile))
+    dictionary_index.build_index(str(wordfile)).close()
+    with open(index_filename, "rb") as f:
+        data = f.read()
+    with open(index_filename, "wb") as f:
+        f.write(corrupt(data))
+
+    with pytest.raises(ValueError):
+        dictionary_index.load_index(index_filename)
+    trie = dictionary_index.open_index(str(wordfile))
+    assert trie.root.find_words() == ["a", "an", "and"]
+    trie.close()
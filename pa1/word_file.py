@@ -0,0 +1,52 @@
+# CS122: Auto-completing keyboard using Tries
+# Word file format
+#
+# Jake Underland
+#
+# A word file has one word per line. A line may also give the word's
+# frequency after a tab:
+#
+#   the<TAB>56271872
+#   aardvark<TAB>312
+#   zymurgy
+#
+# Words without a frequency get DEFAULT_WEIGHT. Blank lines are ignored.
+
+DEFAULT_WEIGHT = 1
+
+
+def parse_line(line):
+    '''
+    Parse one line of a word file.
+
+    Inputs:
+      line (string): the line
+
+    Returns: (string, int) the word and its weight, or None for a blank line
+    '''
+    word, tab, weight = line.strip().partition("\t")
+    word = word.strip()
+    if word == "":
+        return None
+    weight = weight.strip()
+    if tab and weight:
+        return word, int(weight)
+    return word, DEFAULT_WEIGHT
+
+
+def read_weighted_words(lines):
+    '''
+    Generates (word, weight) pairs from the lines of a word file
+    '''
+    for line in lines:
+        entry = parse_line(line)
+        if entry is not None:
+            yield entry
+
+
+def read_words(lines):
+    '''
+    Generates the words from the lines of a word file, ignoring weights
+    '''
+    for word, _ in read_weighted_words(lines):
+        yield word
@@ -0,0 +1,97 @@
+# CS122: Course Search Engine Part 1
+# Parser benchmark
+#
+# Jake Underland
+#
+# Parses a saved set of catalog pages (for instance the snapshot served by
+# snapshot_server.py) with every available backend of page_parser, checks
+# that they all agree with the BeautifulSoup one, and reports pages/sec.
+#
+# Usage: python3 bench_parsers.py DIRECTORY [REPEAT]
+
+import os
+import sys
+import time
+
+import page_parser
+
+
+def load_pages(directory):
+    '''
+    Read every .html (or extensionless) file under directory.
+
+    Outputs:
+        dictionary mapping file names to contents (bytes)
+    '''
+    pages = {}
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if os.path.splitext(filename)[1] in ("", ".html"):
+                path = os.path.join(dirpath, filename)
+                with open(path, "rb") as f:
+                    pages[path] = f.read()
+    return pages
+
+
+def available_parsers():
+    '''
+    The backends that can run here
+    '''
+    return [p for p in page_parser.PARSERS
+            if p != "lxml" or page_parser.lxml is not None]
+
+
+def check_parsers(pages, parsers):
+    '''
+    Compare every parser with the "bs4" one.
+
+    Outputs:
+        dictionary mapping each parser to the files it disagrees on
+    '''
+    mismatches = {parser: [] for parser in parsers}
+    for path, html in pages.items():
+        expected = page_parser.parse(html, "bs4")
+        for parser in parsers:
+            if page_parser.parse(html, parser) != expected:
+                mismatches[parser].append(path)
+    return mismatches
+
+
+def measure(pages, parser, repeat=1):
+    '''
+    Parse all the pages repeat times.
+
+    Outputs:
+        pages per second
+    '''
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages.values():
+            page_parser.parse(html, parser)
+    return repeat * len(pages) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("usage: python3 bench_parsers.py DIRECTORY [REPEAT]")
+        sys.exit(0)
+    repeat = int(sys.argv[2]) if len(sys.argv) == 3 else 3
+
+    pages = load_pages(sys.argv[1])
+    num_bytes = sum(len(html) for html in pages.values())
+    print("%d pages, %.1f KB" % (len(pages), num_bytes / 1024))
+    parsers = available_parsers()
+    mismatches = check_parsers(pages, parsers)
+
+    baseline = None
+    print("%-8s %12s %10s %12s" % ("parser", "pages/sec", "speedup",
+                                    "mismatches"))
+    for parser in parsers:
+        rate = measure(pages, parser, repeat)
+        if baseline is None:
+            baseline = rate
+        print("%-8s %12.1f %9.1fx %12d" % (parser, rate, rate / baseline,
+                                           len(mismatches[parser])))
+    for parser in parsers:
+        for path in mismatches[parser][:5]:
+            print("%s differs from bs4 on %s" % (parser, path))
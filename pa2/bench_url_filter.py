@@ -0,0 +1,100 @@
+# CS122: Course Search Engine Part 1
+# URL filter benchmark
+#
+# Jake Underland
+#
+# Collects every link of a saved set of catalog pages (a link dump of
+# (page URL, href) pairs), then resolves and filters the dump with util's
+# functions and with a UrlFilter, checking that they agree.
+#
+# Usage: python3 bench_url_filter.py DIRECTORY BASE_URL LIMITING_DOMAIN
+#
+# where BASE_URL is the URL the snapshot in DIRECTORY was saved from (or
+# is served at, see snapshot_server.py).
+
+import os
+import sys
+import time
+
+import bench_parsers
+import page_parser
+import url_filter
+import util
+
+REPEAT = 5
+
+
+def load_links(directory, base_url):
+    '''
+    Build a link dump from the pages saved under directory.
+
+    Outputs:
+        list of (page URL, href) pairs
+    '''
+    links = []
+    pages = bench_parsers.load_pages(directory)
+    for path, html in sorted(pages.items()):
+        page_url = base_url + os.path.relpath(path, directory)
+        for href in page_parser.parse(html).links:
+            links.append((page_url, href))
+    return links
+
+
+def follow_plain(links, limiting_domain):
+    followed = []
+    for page_url, href in links:
+        url = util.convert_if_relative_url(page_url,
+                                           util.remove_fragment(href))
+        if url is not None and util.is_url_ok_to_follow(url, limiting_domain):
+            followed.append(url)
+    return followed
+
+
+def follow_filtered(links, url_filter):
+    followed = []
+    for page_url, href in links:
+        followed.extend(url_filter.links(page_url, [href]))
+    return followed
+
+
+def measure(function, *args):
+    '''
+    Run function(*args) REPEAT times.
+
+    Outputs:
+        (result, links per second)
+    '''
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = function(*args)
+    return result, REPEAT * len(args[0]) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("usage: python3 bench_url_filter.py DIRECTORY BASE_URL "
+              "LIMITING_DOMAIN")
+        sys.exit(0)
+    directory, base_url, limiting_domain = sys.argv[1:]
+
+    links = load_links(directory, base_url)
+    print("%d links, %d distinct hrefs" % (len(links),
+                                           len({h for _, h in links})))
+    expected, plain_rate = measure(follow_plain, links, limiting_domain)
+    print("%-16s %12.0f links/sec" % ("util", plain_rate))
+
+    # a fresh filter per run, so that the time includes filling the caches
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fresh = url_filter.UrlFilter(limiting_domain)
+        cold = follow_filtered(links, fresh)
+    cold_rate = REPEAT * len(links) / (time.perf_counter() - start)
+    print("%-16s %12.0f links/sec (%.1fx)" % ("UrlFilter, cold", cold_rate,
+                                              cold_rate / plain_rate))
+
+    warm, warm_rate = measure(follow_filtered, links, fresh)
+    print("%-16s %12.0f links/sec (%.1fx)" % ("UrlFilter, warm", warm_rate,
+                                              warm_rate / plain_rate))
+    print("results agree: %s" % (expected == cold == warm))
+    for name, info in fresh.cache_info().items():
+        print("%s cache: %d hits, %d misses" % (name, info.hits, info.misses))
@@ -0,0 +1,277 @@
+# CS122: Course Search Engine Part 1
+# Binary index format
+#
+# Jake Underland
+#
+# catalog_index.csv repeats a course identifier and a word on every line,
+# and has to be parsed in full before it can answer anything. This module
+# converts it into a binary file, organized by word, that is memory-mapped
+# and searched in place:
+#
+#   header      magic, number of terms, size of the term and postings
+#               blobs
+#   entries     num_terms + 1 triples of 4-byte unsigned ints: offset of
+#               the term in the term blob, offset of its posting list in
+#               the postings blob, and number of postings (the last triple
+#               only marks where the blobs end)
+#   terms       the terms (UTF-8), concatenated in sorted order
+#   postings    for each term, its sorted course identifiers as deltas
+#               from the previous one, each a LEB128 varint (7 bits per
+#               byte, high bit set on all but the last byte)
+#
+# (native byte order). A lookup is a binary search over the entries; only
+# the posting lists of the terms asked for are decoded.
+#
+# Usage: python3 binary_index.py build CSV_FILE INDEX_FILE
+#        python3 binary_index.py query INDEX_FILE [--or] TERM [TERM ...]
+
+import argparse
+import csv
+import heapq
+import mmap
+import os
+import struct
+
+MAGIC = b"CIDX\x00\x01\x00\x00"
+HEADER = struct.Struct("=8sIII")
+ENTRY = struct.Struct("=III")
+
+
+def encode_postings(course_ids):
+    '''
+    Delta and varint encode a sorted list of course identifiers.
+
+    Outputs:
+        bytes
+    '''
+    out = bytearray()
+    previous = 0
+    for course_id in course_ids:
+        delta = course_id - previous
+        previous = course_id
+        while delta >= 0x80:
+            out.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_postings(data, count):
+    '''
+    Decode count delta and varint encoded course identifiers.
+
+    Inputs:
+        data: buffer starting with the posting list
+        count: number of postings
+
+    Outputs:
+        list of course identifiers, sorted
+    '''
+    course_ids = []
+    course_id = 0
+    pos = 0
+    for _ in range(count):
+        delta = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            delta |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        course_id += delta
+        course_ids.append(course_id)
+    return course_ids
+
+
+def read_csv_index(csv_filename):
+    '''
+    Read an index in the crawler's CSV format.
+
+    Outputs:
+        dictionary mapping each word to the set of its course identifiers
+    '''
+    postings = {}
+    with open(csv_filename, newline="") as f:
+        for course_id, word in csv.reader(f, delimiter="|"):
+            postings.setdefault(word, set()).add(int(course_id))
+    return postings
+
+
+def write_index(postings, index_filename):
+    '''
+    Write an index in the binary format.
+
+    Inputs:
+        postings: dictionary mapping words to collections of course
+          identifiers
+        index_filename: name of the file to write
+    '''
+    entries = []
+    terms = bytearray()
+    blob = bytearray()
+    for term in sorted(postings):
+        course_ids = sorted(postings[term])
+        entries.append(ENTRY.pack(len(terms), len(blob), len(course_ids)))
+        terms += term.encode("utf-8")
+        blob += encode_postings(course_ids)
+    entries.append(ENTRY.pack(len(terms), len(blob), 0))
+
+    # write to a temporary file and rename it, so a reader never sees a
+    # partially written index
+    tmp_filename = index_filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(postings), len(terms), len(blob)))
+        f.write(b"".join(entries))
+        f.write(terms)
+        f.write(blob)
+    os.replace(tmp_filename, index_filename)
+
+
+def convert(csv_filename, index_filename):
+    '''
+    Convert an index from the CSV format to the binary one
+    '''
+    write_index(read_csv_index(csv_filename), index_filename)
+
+
+class BinaryIndex(object):
+    def __init__(self, index_filename):
+        '''
+        Memory-map an index file.
+
+        Inputs:
+            index_filename: name of the index file
+        '''
+        with open(index_filename, "rb") as f:
+            self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.mapped) < HEADER.size:
+            magic = None
+        else:
+            magic, self.num_terms, terms_size, postings_size = \
+                HEADER.unpack_from(self.mapped)
+            entries_size = (self.num_terms + 1) * ENTRY.size
+        if magic != MAGIC or len(self.mapped) != (
+                HEADER.size + entries_size + terms_size + postings_size):
+            self.mapped.close()
+            raise ValueError("%s is not a binary index" % index_filename)
+
+        view = memoryview(self.mapped)
+        # flat view of the entry triples
+        self.entries = view[HEADER.size:HEADER.size + entries_size].cast("I")
+        terms_start = HEADER.size + entries_size
+        self.terms = view[terms_start:terms_start + terms_size]
+        self.postings_blob = view[terms_start + terms_size:]
+
+    def __len__(self):
+        return self.num_terms
+
+    def term(self, index):
+        '''
+        The term with the given rank, as bytes
+        '''
+        return bytes(self.terms[self.entries[3 * index]:
+                                self.entries[3 * index + 3]])
+
+    def find(self, term):
+        '''
+        The rank of a term in the dictionary, or None if it is not there
+        '''
+        key = term.encode("utf-8")
+        lo, hi = 0, self.num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.num_terms and self.term(lo) == key:
+            return lo
+        return None
+
+    def __contains__(self, term):
+        return self.find(term) is not None
+
+    def count(self, term):
+        '''
+        Number of courses with the term (without decoding them)
+        '''
+        index = self.find(term)
+        return 0 if index is None else self.entries[3 * index + 2]
+
+    def postings(self, term):
+        '''
+        The sorted course identifiers of the courses with the term
+        '''
+        index = self.find(term)
+        if index is None:
+            return []
+        return decode_postings(
+            self.postings_blob[self.entries[3 * index + 1]:],
+            self.entries[3 * index + 2])
+
+    def and_query(self, terms):
+        '''
+        The sorted identifiers of the courses that have all the terms
+        '''
+        if not terms:
+            return []
+        # intersect starting from the rarest term, so the candidate set
+        # only shrinks
+        ranked = sorted(terms, key=self.count)
+        result = set(self.postings(ranked[0]))
+        for term in ranked[1:]:
+            if not result:
+                break
+            result.intersection_update(self.postings(term))
+        return sorted(result)
+
+    def or_query(self, terms):
+        '''
+        The sorted identifiers of the courses that have any of the terms
+        '''
+        result = []
+        for course_id in heapq.merge(*(self.postings(t) for t in terms)):
+            if not result or result[-1] != course_id:
+                result.append(course_id)
+        return result
+
+    def close(self):
+        for view in (self.entries, self.terms, self.postings_blob):
+            view.release()
+        self.mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build or query a binary course index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="convert a CSV index")
+    build.add_argument("csv_filename", metavar="CSV_FILE")
+    build.add_argument("index_filename", metavar="INDEX_FILE")
+    query = commands.add_parser("query", help="look up courses")
+    query.add_argument("index_filename", metavar="INDEX_FILE")
+    query.add_argument("--or", dest="any", action="store_true",
+                       help="courses with any of the terms (default all)")
+    query.add_argument("terms", metavar="TERM", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        convert(args.csv_filename, args.index_filename)
+        print("%s: %d bytes (CSV: %d bytes)" % (
+            args.index_filename, os.path.getsize(args.index_filename),
+            os.path.getsize(args.csv_filename)))
+    else:
+        with BinaryIndex(args.index_filename) as index:
+            terms = [t.lower() for t in args.terms]
+            found = index.or_query(terms) if args.any \
+                else index.and_query(terms)
+            print(" ".join(str(course_id) for course_id in found))
@@ -0,0 +1,134 @@
+# CS122: Course Search Engine Part 1
+# Resumable crawl state
+#
+# Jake Underland
+#
+# The frontier and the visited set of a crawl, and the index runs it has
+# written (see indexer.py), are kept in a SQLite database. Every URL ever
+# seen is one row of the urls table, numbered in the order it was queued,
+# with its state:
+#
+#   QUEUED   in the frontier
+#   CRAWLED  fetched and indexed
+#   SKIPPED  seen but not crawled (fetch failed, or only reached as the
+#            target of a redirect)
+#
+# so the frontier is the QUEUED rows in id order and the visited set is the
+# whole table. Changes are made inside one open transaction that is only
+# committed by checkpoint(), together with the runs holding the postings
+# of the pages crawled up to then: if the crawl dies, the database is left
+# at the last checkpoint, where the frontier and the index agree, and
+# pages that were in flight are simply still QUEUED.
+#
+# The frontier and visited set are also held in memory (a deque and a set)
+# so the crawler never has to query the database.
+
+import collections
+import sqlite3
+
+QUEUED = 0
+CRAWLED = 1
+SKIPPED = 2
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,
+    url TEXT UNIQUE NOT NULL,
+    state INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    filename TEXT PRIMARY KEY
+);
+'''
+
+
+class CrawlState(object):
+    def __init__(self, filename=":memory:"):
+        '''
+        Open (or create) the state of a crawl.
+
+        Inputs:
+            filename: the SQLite database; the default keeps the state in
+              memory only
+        '''
+        self.conn = sqlite3.connect(filename, isolation_level="DEFERRED")
+        self.conn.executescript(SCHEMA)
+        self.visited = set()
+        self.frontier = collections.deque()
+        self.num_crawled = 0
+        for url, state in self.conn.execute(
+                "SELECT url, state FROM urls ORDER BY id"):
+            self.visited.add(url)
+            if state == QUEUED:
+                self.frontier.append(url)
+            elif state == CRAWLED:
+                self.num_crawled += 1
+        self.runs = [filename for (filename,) in self.conn.execute(
+            "SELECT filename FROM runs ORDER BY filename")]
+
+    def add(self, url):
+        '''
+        Queue a URL unless it has been seen before.
+
+        Outputs:
+            True if the URL was queued
+        '''
+        if url in self.visited:
+            return False
+        self.visited.add(url)
+        self.frontier.append(url)
+        self.conn.execute("INSERT INTO urls (url, state) VALUES (?, ?)",
+                          (url, QUEUED))
+        return True
+
+    def mark_seen(self, url):
+        '''
+        Record a URL reached without being queued (a redirect target), so
+        that it is never crawled.
+
+        Outputs:
+            False if the URL had already been seen
+        '''
+        if url in self.visited:
+            return False
+        self.visited.add(url)
+        self.conn.execute("INSERT INTO urls (url, state) VALUES (?, ?)",
+                          (url, SKIPPED))
+        return True
+
+    def pop(self):
+        '''
+        Take the next URL from the frontier (None if it is empty). The URL
+        stays QUEUED on disk until it is marked crawled or skipped.
+        '''
+        return self.frontier.popleft() if self.frontier else None
+
+    def set_state(self, url, state):
+        '''
+        Record that a URL taken from the frontier was CRAWLED or SKIPPED
+        '''
+        if state == CRAWLED:
+            self.num_crawled += 1
+        self.conn.execute("UPDATE urls SET state = ? WHERE url = ?",
+                          (state, url))
+
+    def checkpoint(self, runs=()):
+        '''
+        Make everything recorded so far durable, along with the index runs.
+
+        Inputs:
+            runs: names of the run files holding every posting found so
+              far (those already recorded are ignored)
+        '''
+        new_runs = [filename for filename in runs
+                    if filename not in self.runs]
+        self.conn.executemany("INSERT INTO runs (filename) VALUES (?)",
+                              [(filename,) for filename in new_runs])
+        self.runs.extend(new_runs)
+        self.conn.commit()
+
+    def close(self):
+        '''
+        Close the database, discarding anything since the last checkpoint
+        '''
+        self.conn.close()
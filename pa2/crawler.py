@@ -1,15 +1,56 @@
 # CS122: Course Search Engine Part 1
 #
-# Your name(s)
+# Jake Underland
 #
+# The crawl is breadth first from starting_url and runs as a pipeline of
+# three stages:
+#
+#   fetch   a pool of worker threads sharing one pooled requests.Session,
+#           with a per-host limit on concurrent requests and on how often
+#           requests may start (the I/O-bound part)
+#   parse   a pool of processes that parse the pages and tokenize their
+#           courses (the CPU-bound part)
+#   index   the main thread, the only one touching the frontier, the
+#           visited set and the index
+#
+# The stages are bounded: at most PARSE_QUEUE pages per process may be
+# waiting for or in the parse stage, and a fetcher that finishes a page
+# while the parse stage is full blocks until there is room, so a slow
+# stage holds back the ones before it instead of piling up pages in
+# memory. The index stage handles pages in the order they were queued, so
+# the crawl visits exactly the same pages, in the same order, as a
+# sequential breadth-first crawl, whatever the number of workers.
+#
+# The postings are collected by an Indexer (see indexer.py), which spills
+# them to sorted runs on disk when they outgrow its memory budget and
+# merges the runs into the index at the end.
+#
+# The frontier, the visited set and the runs written so far can be kept in
+# a database file (see crawl_state.py) that is checkpointed every so often,
+# so that an interrupted crawl can be resumed by running it again with the
+# same file.
 
 import re
 import util
-import bs4
-import queue
 import json
 import sys
-import csv
+import collections
+import concurrent.futures
+import contextlib
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import requests
+
+import crawl_state
+import http_cache
+import indexer
+import page_parser
+import url_filter
 
 INDEX_IGNORE = set(['a', 'also', 'an', 'and', 'are', 'as', 'at', 'be',
                     'but', 'by', 'course', 'for', 'from', 'how', 'i',
@@ -19,10 +60,345 @@ INDEX_IGNORE = set(['a', 'also', 'an', 'and', 'are', 'as', 'at', 'be',
                     'topics', 'units', 'we', 'were', 'which', 'will', 'with',
                     'yet'])
 
+STARTING_URL = ("http://www.classes.cs.uchicago.edu/archive/2015/winter"
+                "/12200-1/new.collegecatalog.uchicago.edu/index.html")
+LIMITING_DOMAIN = "classes.cs.uchicago.edu"
+
+WORD_RE = re.compile(r"[a-zA-Z][a-zA-Z0-9_]*")
+
+# number of pages fetched at once
+WORKERS = 8
+# number of processes parsing pages (0 to parse in the fetcher threads);
+# one core is left to the fetchers and the index stage
+PROCESSES = min(4, (os.cpu_count() or 1) - 1)
+# pages per parse process that may be waiting for or in the parse stage
+PARSE_QUEUE = 2
+# politeness: requests in flight to one host, and seconds between the
+# starts of two requests to the same host
+HOST_CONNECTIONS = 4
+HOST_DELAY = 0.05
+# checkpoint after this many pages or seconds, whichever comes first
+CHECKPOINT_PAGES = 100
+CHECKPOINT_SECONDS = 30
+# how pages are parsed, one of page_parser.PARSERS
+PARSER = "stream"
+
+logger = logging.getLogger(__name__)
+
+# courses are (course code, frozenset of words) pairs and times the seconds
+# the page spent in each stage
+Page = collections.namedtuple("Page", ["url", "final_url", "courses",
+                                       "links", "nbytes", "times"])
+# a page that has been fetched; parsed is a future of the result of
+# parse_page
+FetchedPage = collections.namedtuple("FetchedPage", [
+    "url", "final_url", "nbytes", "times", "parsed"])
+
 
 ### YOUR FUNCTIONS HERE
 
-def go(num_pages_to_crawl, course_map_filename, index_filename):
+def make_session(pool_size=WORKERS):
+    '''
+    Create a requests.Session keeping up to pool_size connections per host
+    open, so that the workers reuse connections instead of opening one per
+    URL.
+    '''
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                            pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class HostLimiter(object):
+    '''
+    Per-host politeness limit shared by the worker threads: at most
+    max_connections requests in flight to a host, started at least delay
+    seconds apart.
+    '''
+
+    def __init__(self, max_connections=HOST_CONNECTIONS, delay=HOST_DELAY):
+        self.max_connections = max_connections
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.slots = {}  # host -> semaphore of the free connections
+        self.next_start = {}  # host -> earliest time of the next request
+
+    @contextlib.contextmanager
+    def limit(self, url):
+        '''
+        Context manager to hold while requesting url
+        '''
+        host = urllib.parse.urlparse(url).netloc
+        with self.lock:
+            slots = self.slots.get(host)
+            if slots is None:
+                slots = threading.BoundedSemaphore(self.max_connections)
+                self.slots[host] = slots
+
+        with slots:
+            with self.lock:
+                now = time.monotonic()
+                start = max(now, self.next_start.get(host, now))
+                self.next_start[host] = start + self.delay
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+
+def get_links(hrefs, page_url, limiting_domain):
+    '''
+    Find the URLs linked from a page that the crawler should follow.
+
+    Inputs:
+        hrefs: the hrefs of the page's links
+        page_url: the (absolute) URL of the page
+        limiting_domain: domain name the crawl stays within
+
+    Outputs:
+        list of absolute URLs without fragments, in page order
+    '''
+    # same as util.convert_if_relative_url and util.is_url_ok_to_follow,
+    # memoized
+    return url_filter.get_filter(limiting_domain).links(page_url, hrefs)
+
+
+def parse_page(html, page_url, limiting_domain, parser=PARSER):
+    '''
+    Parse a page and tokenize its courses (run by the parse processes).
+
+    Inputs:
+        html: the page
+        page_url: the (absolute) URL of the page
+        limiting_domain: domain name the crawl stays within
+        parser: which of page_parser.PARSERS to use
+
+    Outputs:
+        (links, courses, seconds taken), where links are the URLs to
+        follow and courses (course code, frozenset of words) pairs
+    '''
+    start = time.perf_counter()
+    parsed = page_parser.parse(html, parser)
+    links = get_links(parsed.links, page_url, limiting_domain)
+    courses = [(code, frozenset(get_words(text)))
+               for code, text in parsed.courses]
+    return links, courses, time.perf_counter() - start
+
+
+def fetch_page(url, limiting_domain, session=None, limiter=None,
+               parser=PARSER, parse_pool=None, parse_slots=None,
+               cache=None):
+    '''
+    Fetch one page and pass it on to the parse stage (run by the fetcher
+    threads).
+
+    Inputs:
+        url: absolute URL of the page
+        limiting_domain: domain name the crawl stays within
+        session: requests.Session to fetch with
+        limiter: HostLimiter to respect, if any
+        parser: which of page_parser.PARSERS to use
+        parse_pool: executor to parse with (None to parse in this thread)
+        parse_slots: semaphore counting the free places in the parse stage
+        cache: HttpCache to fetch through, if any
+
+    Outputs:
+        FetchedPage, or None if the page could not be fetched or
+        redirected outside of the domain
+    '''
+    start = time.perf_counter()
+    # pages served from the cache do not load the server
+    polite = limiter is not None and \
+        (cache is None or not cache.is_fresh(url))
+    with limiter.limit(url) if polite else contextlib.nullcontext():
+        request = util.get_request(url, session, cache)
+        if request is None:
+            return None
+        html = util.read_request(request)
+
+    final_url = util.remove_fragment(util.get_request_url(request))
+    if final_url != url and \
+            not url_filter.get_filter(limiting_domain).is_ok(final_url):
+        return None
+    times = {"fetch": time.perf_counter() - start}
+
+    if parse_pool is None:
+        parsed = concurrent.futures.Future()
+        try:
+            parsed.set_result(parse_page(html, final_url, limiting_domain,
+                                         parser))
+        except Exception as e:
+            # reported by crawl, as for the parse processes
+            parsed.set_exception(e)
+    else:
+        start = time.perf_counter()
+        parse_slots.acquire()
+        times["parse queue"] = time.perf_counter() - start
+        parsed = parse_pool.submit(parse_page, html, final_url,
+                                   limiting_domain, parser)
+        parsed.add_done_callback(lambda _: parse_slots.release())
+    return FetchedPage(url, final_url, len(html), times, parsed)
+
+
+def crawl(num_pages_to_crawl, starting_url=STARTING_URL,
+          limiting_domain=LIMITING_DOMAIN, workers=WORKERS, session=None,
+          limiter=None, state=None, parser=PARSER, processes=PROCESSES,
+          cache=None):
+    '''
+    Crawl breadth first from starting_url, fetching up to workers pages at
+    a time and parsing them in processes worker processes.
+
+    Inputs:
+        num_pages_to_crawl: the number of pages to process during the crawl
+          (including those crawled before, when resuming)
+        starting_url: absolute URL where the crawl starts
+        limiting_domain: domain name the crawl stays within
+        workers: number of fetcher threads
+        session: requests.Session to fetch with (by default a new pooled
+          one)
+        limiter: HostLimiter (by default a new one with the default limits)
+        state: CrawlState to record the crawl in, or resume it from (by
+          default a new one in memory)
+        parser: which of page_parser.PARSERS to use
+        processes: number of parse processes (0 to parse in the fetcher
+          threads)
+        cache: HttpCache to fetch through, if any
+
+    Outputs:
+        generates a Page for each page processed, in queue order
+    '''
+    if session is None:
+        session = make_session(workers)
+    if limiter is None:
+        limiter = HostLimiter()
+    if state is None:
+        state = crawl_state.CrawlState()
+
+    # a no-op when resuming
+    state.add(util.remove_fragment(starting_url))
+
+    parse_queue = PARSE_QUEUE * max(processes, 1)
+    parse_slots = threading.BoundedSemaphore(parse_queue)
+    # pages are queued for the fetchers until this many are in flight
+    max_pending = workers + parse_queue
+    pending = collections.deque()  # (url, future) pairs, in queue order
+
+    with (concurrent.futures.ProcessPoolExecutor(processes) if processes
+          else contextlib.nullcontext()) as parse_pool, \
+            concurrent.futures.ThreadPoolExecutor(workers) as fetchers:
+        try:
+            while state.num_crawled < num_pages_to_crawl:
+                while (state.frontier and len(pending) < max_pending
+                       and (state.num_crawled + len(pending)
+                            < num_pages_to_crawl)):
+                    url = state.pop()
+                    pending.append((url, fetchers.submit(
+                        fetch_page, url, limiting_domain, session, limiter,
+                        parser, parse_pool, parse_slots, cache)))
+                if not pending:
+                    break
+
+                url, future = pending.popleft()
+                start = time.perf_counter()
+                fetched = future.result()
+                if fetched is None or (fetched.final_url != url and
+                                       not state.mark_seen(
+                                           fetched.final_url)):
+                    state.set_state(url, crawl_state.SKIPPED)
+                    continue
+                try:
+                    links, courses, parse_time = fetched.parsed.result()
+                except concurrent.futures.BrokenExecutor:
+                    raise
+                except Exception:
+                    # one unparsable page should not end the crawl (nor
+                    # every resumed one)
+                    logger.warning("could not parse %s", url,
+                                   exc_info=True)
+                    state.set_state(url, crawl_state.SKIPPED)
+                    continue
+                times = dict(fetched.times, parse=parse_time)
+                times["index wait"] = time.perf_counter() - start
+
+                for link in links:
+                    state.add(link)
+                state.set_state(url, crawl_state.CRAWLED)
+                yield Page(url, fetched.final_url, courses, links,
+                           fetched.nbytes, times)
+        finally:
+            # only left over if the caller stopped early
+            for _, future in pending:
+                future.cancel()
+
+
+class CrawlStats(object):
+    '''
+    Throughput of a crawl since it was (re)started
+    '''
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.num_pages = 0
+        self.num_bytes = 0
+        self.times = collections.Counter()  # total seconds in each stage
+
+    def add(self, page, index_time=0):
+        self.num_pages += 1
+        self.num_bytes += page.nbytes
+        self.times.update(page.times)
+        self.times["index"] += index_time
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        return "%d pages, %.1f KB in %.1f s (%.1f pages/s, %.1f KB/s)" % (
+            self.num_pages, self.num_bytes / 1024, elapsed,
+            self.num_pages / elapsed, self.num_bytes / 1024 / elapsed)
+
+    def stage_report(self):
+        '''
+        Mean milliseconds per page spent in each stage ("parse queue" is
+        the time fetchers were blocked by a full parse stage, "index wait"
+        the time the index stage waited for the next page)
+        '''
+        return ", ".join("%s %.2f ms" % (stage, 1000 * total
+                                         / max(self.num_pages, 1))
+                         for stage, total in sorted(self.times.items()))
+
+
+def get_words(text):
+    '''
+    The indexable words of a piece of text: lower-cased, without the words
+    in INDEX_IGNORE.
+    '''
+    return {word for word in (w.lower() for w in WORD_RE.findall(text))
+            if word not in INDEX_IGNORE}
+
+
+def index_page(courses, course_map):
+    '''
+    Find the index entries for the courses on a page.
+
+    Inputs:
+        courses: the page's (course code, set of words) pairs
+        course_map: dictionary mapping course codes to identifiers
+
+    Outputs:
+        set of (course identifier, word) pairs
+    '''
+    postings = set()
+    for code, words in courses:
+        course_id = course_map.get(code)
+        if course_id is not None:
+            postings.update((course_id, word) for word in words)
+    return postings
+
+
+def go(num_pages_to_crawl, course_map_filename, index_filename,
+       starting_url=STARTING_URL, limiting_domain=LIMITING_DOMAIN,
+       workers=WORKERS, state_filename=None,
+       memory_budget=indexer.MEMORY_BUDGET, parser=PARSER,
+       processes=PROCESSES, cache_dir=None):
     '''
     Crawl the college catalog and generate a CSV file with an index.
 
@@ -31,33 +407,97 @@ def go(num_pages_to_crawl, course_map_filename, index_filename):
         course_map_filename: the name of a JSON file that contains the mapping of
           course codes to course identifiers
         index_filename: the name for the CSV of the index.
+        starting_url: absolute URL where the crawl starts (point it at a
+          local copy of the catalog to crawl offline, see
+          snapshot_server.py)
+        limiting_domain: domain name the crawl stays within
+        workers: number of pages fetched at once
+        state_filename: database file to checkpoint the crawl to, and to
+          resume it from if it exists (None to keep it in memory); the
+          index runs go in the directory state_filename + ".runs"
+        memory_budget: approximate bytes of postings kept in memory
+        parser: which of page_parser.PARSERS to use
+        processes: number of processes parsing pages
+        cache_dir: directory of an HTTP cache to fetch through (see
+          http_cache.py), if any
 
     Outputs:
         CSV file of the index
     '''
+    with open(course_map_filename) as f:
+        course_map = json.load(f)
+
+    if state_filename is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        state = crawl_state.CrawlState()
+        run_dir = temp_dir.name
+    else:
+        temp_dir = None
+        state = crawl_state.CrawlState(state_filename)
+        run_dir = state_filename + ".runs"
+    if state.num_crawled:
+        logger.info("resuming after %d pages, %d queued",
+                    state.num_crawled, len(state.frontier))
+    index = indexer.Indexer(run_dir, memory_budget, state.runs)
+    cache = http_cache.HttpCache(cache_dir) if cache_dir else None
+    stats = CrawlStats()
+    last_checkpoint = time.monotonic()
 
-    starting_url = ("http://www.classes.cs.uchicago.edu/archive/2015/winter"
-                    "/12200-1/new.collegecatalog.uchicago.edu/index.html")
-    limiting_domain = "classes.cs.uchicago.edu"
+    try:
+        for page in crawl(num_pages_to_crawl, starting_url, limiting_domain,
+                          workers, state=state, parser=parser,
+                          processes=processes, cache=cache):
+            start = time.perf_counter()
+            index.add(index_page(page.courses, course_map))
+            stats.add(page, time.perf_counter() - start)
+            if (stats.num_pages % CHECKPOINT_PAGES == 0 or
+                    time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS):
+                if state_filename is not None:
+                    index.spill()
+                    state.checkpoint(index.runs)
+                last_checkpoint = time.monotonic()
+                logger.info("checkpoint: %s, %d queued, %d runs",
+                            stats.report(), len(state.frontier),
+                            len(index.runs))
 
-    # YOUR CODE HERE
+        if state_filename is not None:
+            index.spill()
+            state.checkpoint(index.runs)
+        logger.info("done: %s", stats.report())
+        logger.info("per page: %s", stats.stage_report())
+        if cache is not None:
+            logger.info(cache.report())
+        num_postings = index.merge(index_filename)
+        logger.info("merged %d runs into %d postings", len(index.runs),
+                    num_postings)
+    finally:
+        state.close()
+        if cache is not None:
+            cache.close()
+        if temp_dir is not None:
+            temp_dir.cleanup()
 
 
 if __name__ == "__main__":
-    usage = "python3 crawl.py <number of pages to crawl>"
+    usage = "python3 crawl.py <number of pages to crawl> [<state file>]"
     args_len = len(sys.argv)
     course_map_filename = "course_map.json"
     index_filename = "catalog_index.csv"
+    state_filename = None
     if args_len == 1:
         num_pages_to_crawl = 1000
-    elif args_len == 2:
+    elif args_len in (2, 3):
         try:
             num_pages_to_crawl = int(sys.argv[1])
         except ValueError:
             print(usage)
             sys.exit(0)
+        if args_len == 3:
+            state_filename = sys.argv[2]
     else:
         print(usage)
         sys.exit(0)
 
-    go(num_pages_to_crawl, course_map_filename, index_filename)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    go(num_pages_to_crawl, course_map_filename, index_filename,
+       state_filename=state_filename)
@@ -0,0 +1,219 @@
+# CS122: Course Search Engine Part 1
+# Disk cache for HTTP responses
+#
+# Jake Underland
+#
+# Development crawls fetch the same catalog pages over and over. Given a
+# cache, util.get_request looks pages up here first:
+#
+#   - an entry younger than max_age is served from disk (a hit);
+#   - an older entry is revalidated with a conditional request
+#     (If-None-Match / If-Modified-Since from its ETag / Last-Modified);
+#     a 304 answer serves the stored copy (a revalidation), anything else
+#     replaces it;
+#   - anything else is fetched and stored (a miss).
+#
+# Entries are keyed by URL without its fragment, and kept in a SQLite
+# database in the cache directory along with when they were last used.
+# When the bodies outgrow max_bytes, the least recently used entries are
+# evicted.
+
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+import util
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# seconds during which a stored page is served without asking the server
+DEFAULT_MAX_AGE = 24 * 60 * 60
+DATABASE_NAME = "http_cache.db"
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    encoding TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    size INTEGER NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+'''
+
+
+class CachedResponse(object):
+    '''
+    A response served from the cache, with the attributes of a
+    requests.Response that util uses
+    '''
+
+    def __init__(self, url, content, encoding, status_code=200):
+        self.url = url
+        self.content = content
+        self.encoding = encoding
+        self.status_code = status_code
+
+    @property
+    def text(self):
+        # requests falls back to Latin-1 for text without a charset
+        return self.content.decode(self.encoding or "iso-8859-1",
+                                   errors="replace")
+
+
+class HttpCache(object):
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age=DEFAULT_MAX_AGE):
+        '''
+        Open (or create) a cache.
+
+        Inputs:
+            directory: where to keep the cache
+            max_bytes: total size of the stored bodies before the least
+              recently used entries are evicted
+            max_age: seconds during which an entry is served without
+              revalidating it (0 to always revalidate)
+        '''
+        os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        # shared by the fetcher threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, DATABASE_NAME),
+                                    isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        (self.num_bytes,) = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.evictions = 0
+        # in case the cache was made with a larger max_bytes
+        self.evict()
+
+    def is_fresh(self, url):
+        '''
+        Whether get(url) would be served without contacting the server
+        '''
+        with self.lock:
+            entry = self.conn.execute(
+                "SELECT stored_at FROM entries WHERE key = ?",
+                (util.remove_fragment(url),)).fetchone()
+        return entry is not None and time.time() - entry[0] < self.max_age
+
+    def get(self, url, session=None):
+        '''
+        Get a page through the cache.
+
+        Inputs:
+            url: absolute URL
+            session: requests.Session to fetch with, if any
+
+        Outputs:
+            a CachedResponse or a requests.Response (network errors are
+            raised, as by requests.get)
+        '''
+        key = util.remove_fragment(url)
+        with self.lock:
+            entry = self.conn.execute(
+                "SELECT url, encoding, etag, last_modified, stored_at, body "
+                "FROM entries WHERE key = ?", (key,)).fetchone()
+            if entry is not None and \
+                    time.time() - entry[4] < self.max_age:
+                self.hits += 1
+                self.touch(key)
+                return CachedResponse(entry[0], entry[5], entry[1])
+
+        headers = {}
+        if entry is not None:
+            if entry[2]:
+                headers["If-None-Match"] = entry[2]
+            if entry[3]:
+                headers["If-Modified-Since"] = entry[3]
+        response = (session or requests).get(url, headers=headers)
+
+        with self.lock:
+            if entry is not None and response.status_code == 304:
+                self.revalidations += 1
+                self.touch(key, stored=True)
+                return CachedResponse(entry[0], entry[5], entry[1])
+            self.misses += 1
+            if response.status_code == 200:
+                self.store(key, response)
+        return response
+
+    def touch(self, key, stored=False):
+        '''
+        Mark an entry as just used (and, if stored, as just validated)
+        '''
+        now = time.time()
+        if stored:
+            self.conn.execute("UPDATE entries SET last_used = ?, "
+                              "stored_at = ? WHERE key = ?", (now, now, key))
+        else:
+            self.conn.execute("UPDATE entries SET last_used = ? "
+                              "WHERE key = ?", (now, key))
+
+    def store(self, key, response):
+        '''
+        Store a response, evicting other entries if needed
+        '''
+        body = response.content
+        if len(body) > self.max_bytes:
+            return
+        old = self.conn.execute("SELECT size FROM entries WHERE key = ?",
+                                (key,)).fetchone()
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (key, url, encoding, etag, "
+            "last_modified, stored_at, last_used, size, body) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, response.url, response.encoding,
+             response.headers.get("ETag"),
+             response.headers.get("Last-Modified"), now, now, len(body),
+             body))
+        self.num_bytes += len(body) - (old[0] if old else 0)
+        self.evict()
+
+    def evict(self):
+        '''
+        Evict the least recently used entries until the cache fits
+        '''
+        while self.num_bytes > self.max_bytes:
+            victim, size = self.conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_used "
+                "LIMIT 1").fetchone()
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (victim,))
+            self.num_bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        '''
+        Counts of hits, revalidations, misses and evictions, the hit rate
+        (hits and revalidations over lookups) and the bytes stored
+        '''
+        lookups = self.hits + self.revalidations + self.misses
+        return {"hits": self.hits,
+                "revalidations": self.revalidations,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": ((self.hits + self.revalidations) / lookups
+                             if lookups else 0),
+                "bytes": self.num_bytes}
+
+    def report(self):
+        stats = self.stats()
+        stats["hit_rate"] *= 100
+        return ("cache: %(hits)d hits, %(revalidations)d revalidated, "
+                "%(misses)d misses (hit rate %(hit_rate).1f%%), "
+                "%(evictions)d evicted, %(bytes)d bytes" % stats)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,169 @@
+# CS122: Course Search Engine Part 1
+# Index builder with a memory budget
+#
+# Jake Underland
+#
+# Postings ((course identifier, word) pairs) are collected in memory until
+# their estimated size reaches the budget. At that point they are sorted
+# and written out as a run file, and collection starts again. At the end
+# the runs are merged with a k-way merge into the final index. The merge
+# reads every run sequentially and keeps one line of each in memory, so
+# the size of the index is only bounded by the disk. At most MERGE_FAN_IN
+# files are open at once: when there are more runs than that, groups of
+# them are first merged into intermediate runs, in as many passes as
+# needed.
+#
+# Runs use the index's own format, one "course identifier|word" line per
+# posting, sorted by course identifier (as a number) and then by word.
+
+import csv
+import heapq
+import os
+
+# default budget for the postings held in memory, in bytes
+MEMORY_BUDGET = 64 * 1024 * 1024
+# measured size of one posting in the set, not counting its word's letters
+POSTING_OVERHEAD = 150
+# most runs merged at once (each is an open file)
+MERGE_FAN_IN = 64
+
+
+class Indexer(object):
+    def __init__(self, run_dir, memory_budget=MEMORY_BUDGET, runs=()):
+        '''
+        Constructor
+
+        Inputs:
+            run_dir: directory to write the runs to
+            memory_budget: approximate bytes of postings kept in memory
+              before they are spilled to a run
+            runs: names of runs already written (when resuming a crawl)
+        '''
+        self.run_dir = run_dir
+        self.memory_budget = memory_budget
+        self.runs = list(runs)
+        self.postings = set()
+        self.nbytes = 0
+
+    def add(self, postings):
+        '''
+        Add (course identifier, word) pairs to the index, spilling them to
+        a run if the budget is exceeded.
+        '''
+        for posting in postings:
+            if posting not in self.postings:
+                self.postings.add(posting)
+                self.nbytes += POSTING_OVERHEAD + len(posting[1])
+        if self.nbytes >= self.memory_budget:
+            self.spill()
+
+    def spill(self):
+        '''
+        Write the postings in memory to a new sorted run (if there are
+        any) and forget them.
+
+        Outputs:
+            the name of the run, or None
+        '''
+        if not self.postings:
+            return None
+        os.makedirs(self.run_dir, exist_ok=True)
+        filename = os.path.join(self.run_dir,
+                                "run-%05d.csv" % len(self.runs))
+        write_postings(sorted(self.postings), filename)
+        self.runs.append(filename)
+        self.postings = set()
+        self.nbytes = 0
+        return filename
+
+    def merge(self, index_filename, fan_in=MERGE_FAN_IN):
+        '''
+        Merge the runs and the postings still in memory into the final
+        index file.
+
+        Inputs:
+            index_filename: the index file to write
+            fan_in: most runs merged at once (at least 2)
+
+        Outputs:
+            the number of postings in the index
+        '''
+        if fan_in < 2:
+            raise ValueError("fan_in must be at least 2")
+        runs = list(self.runs)
+        intermediate = []
+        try:
+            # the last pass also merges the postings in memory, so it
+            # takes at most fan_in - 1 runs
+            while len(runs) >= fan_in:
+                merged = []
+                for start in range(0, len(runs), fan_in):
+                    group = runs[start:start + fan_in]
+                    if len(group) == 1:
+                        merged.append(group[0])
+                        continue
+                    filename = os.path.join(
+                        self.run_dir, "merge-%05d.csv" % len(intermediate))
+                    merge_runs(group, [], filename)
+                    intermediate.append(filename)
+                    merged.append(filename)
+                runs = merged
+            return merge_runs(runs, sorted(self.postings), index_filename)
+        finally:
+            for filename in intermediate:
+                os.remove(filename)
+
+
+def merge_runs(run_filenames, postings, filename):
+    '''
+    Merge run files and a sorted list of postings into a file, without
+    repeats.
+
+    Outputs:
+        the number of postings written
+    '''
+    files = [open(run, newline="") for run in run_filenames]
+    try:
+        streams = [read_postings(f) for f in files]
+        streams.append(postings)
+        return write_postings(unique(heapq.merge(*streams)), filename)
+    finally:
+        for f in files:
+            f.close()
+
+
+def read_postings(f):
+    '''
+    Generates the (course identifier, word) pairs of an open run or index
+    file
+    '''
+    for course_id, word in csv.reader(f, delimiter="|"):
+        yield int(course_id), word
+
+
+def write_postings(postings, filename):
+    '''
+    Write (course identifier, word) pairs to a file, one per line.
+
+    Outputs:
+        the number of postings written
+    '''
+    num_postings = 0
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f, delimiter="|")
+        for posting in postings:
+            writer.writerow(posting)
+            num_postings += 1
+    return num_postings
+
+
+def unique(postings):
+    '''
+    Drop the repeats from a sorted stream of postings (a posting found in
+    several runs)
+    '''
+    previous = None
+    for posting in postings:
+        if posting != previous:
+            yield posting
+            previous = posting
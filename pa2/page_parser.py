@@ -0,0 +1,285 @@
+# CS122: Course Search Engine Part 1
+# Catalog page parsers
+#
+# Jake Underland
+#
+# The crawler only needs two things from a page: the hrefs of its links and
+# its courses. This module gets them with one of three backends:
+#
+#   "bs4"     builds the full BeautifulSoup tree and walks it with
+#             util.find_sequence (the original approach)
+#   "lxml"    builds an lxml tree, which is done in C (needs lxml)
+#   "stream"  a html.parser handler that keeps nothing but the links and
+#             the text of the courseblocks while the page streams by
+#
+# All three produce the same result (see bench_parsers.py), including for
+# empty pages and pages cut off inside a courseblock, except that for
+# pages that are not valid UTF-8 bs4 may guess another encoding than the
+# Latin-1 the others fall back to, and that a page cut off in the middle
+# of a tag or character reference is repaired differently by each.
+#
+# A course is described by the title and description of its courseblock
+# (div.courseblock, with p.courseblocktitle and p.courseblockdesc). The
+# "courseblock subsequence" divs right after a courseblock (separated only
+# by whitespace) are the courses of a sequence; each of them is also
+# described by the title and description of the sequence block.
+
+import collections
+import html.parser
+
+import bs4
+
+import util
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+PARSERS = ("bs4", "lxml", "stream")
+
+ParsedPage = collections.namedtuple("ParsedPage", ["links", "courses"])
+
+# a courseblock in page order; follows is whether it comes right after the
+# previous courseblock, so that it can continue a sequence
+Block = collections.namedtuple("Block", ["title", "desc", "subsequence",
+                                         "follows"])
+
+COURSEBLOCK_XPATH = ("//div[contains(concat(' ', normalize-space(@class), "
+                     "' '), ' courseblock ')]")
+
+
+def parse(html, parser="stream"):
+    '''
+    Extract the links and courses of a catalog page.
+
+    Inputs:
+        html: the page (bytes, as returned by util.read_request)
+        parser: one of PARSERS
+
+    Outputs:
+        ParsedPage, whose links are the raw hrefs in page order and whose
+        courses are (course code, text) pairs
+    '''
+    if parser == "bs4":
+        return parse_bs4(html)
+    text = decode(html)
+    if parser == "lxml":
+        if lxml is None:
+            raise ValueError("the lxml parser needs the lxml package")
+        return parse_lxml(text)
+    if parser == "stream":
+        return parse_stream(text)
+    raise ValueError("unknown parser %r (expected one of %s)"
+                     % (parser, ", ".join(PARSERS)))
+
+
+def decode(html):
+    '''
+    Decode a page: UTF-8 if it is valid UTF-8, Latin-1 otherwise
+    '''
+    if isinstance(html, str):
+        return html
+    try:
+        return html.decode("utf-8")
+    except UnicodeDecodeError:
+        return html.decode("iso-8859-1")
+
+
+def course_code(title):
+    '''
+    Extract the course code from a courseblock title, e.g.
+    "CMSC 12200. Computer Science with Applications II. 100 Units."
+    '''
+    return title.replace("\xa0", " ").split(".")[0].strip()
+
+
+def group_courses(blocks):
+    '''
+    Turn courseblocks, in page order, into (course code, text) pairs.
+    '''
+    courses = []
+    sequence = None  # [title, desc, number of courses] of the open block
+    for block in blocks:
+        if not block.subsequence:
+            if sequence is not None and sequence[2] == 0:
+                courses.append((course_code(sequence[0]),
+                                sequence[0] + " " + sequence[1]))
+            sequence = [block.title, block.desc, 0]
+        elif sequence is not None and block.follows:
+            courses.append((course_code(block.title), " ".join(
+                [sequence[0], sequence[1], block.title, block.desc])))
+            sequence[2] += 1
+            continue
+        elif sequence is not None:
+            # a stray subsequence ends the open block's sequence
+            if sequence[2] == 0:
+                courses.append((course_code(sequence[0]),
+                                sequence[0] + " " + sequence[1]))
+            sequence = None
+    if sequence is not None and sequence[2] == 0:
+        courses.append((course_code(sequence[0]),
+                        sequence[0] + " " + sequence[1]))
+    return courses
+
+
+### BeautifulSoup
+
+def block_text(tag):
+    '''
+    Get the title and description text of a courseblock tag.
+
+    Outputs:
+        (title, description) strings
+    '''
+    title = tag.find("p", class_="courseblocktitle")
+    desc = tag.find("p", class_="courseblockdesc")
+    return (title.text if title else "", desc.text if desc else "")
+
+
+def parse_bs4(html):
+    soup = bs4.BeautifulSoup(html, "html.parser")
+    links = [tag["href"] for tag in soup.find_all("a", href=True)]
+    courses = []
+    for tag in soup.find_all("div", class_="courseblock"):
+        if util.is_subsequence(tag):
+            continue
+        title, desc = block_text(tag)
+        sequence = util.find_sequence(tag)
+        if not sequence:
+            courses.append((course_code(title), title + " " + desc))
+        for sub in sequence:
+            sub_title, sub_desc = block_text(sub)
+            courses.append((course_code(sub_title), " ".join(
+                [title, desc, sub_title, sub_desc])))
+    return ParsedPage(links, courses)
+
+
+### lxml
+
+def lxml_text(div, css_class):
+    '''
+    Text of the first p of class css_class in div ("" if none)
+    '''
+    found = div.xpath(".//p[contains(concat(' ', normalize-space(@class), "
+                      "' '), ' %s ')]" % css_class)
+    return found[0].text_content() if found else ""
+
+
+def is_lxml_courseblock(element):
+    return (isinstance(element.tag, str) and element.tag == "div" and
+            "courseblock" in element.get("class", "").split())
+
+
+def parse_lxml(text):
+    try:
+        root = lxml.html.fromstring(text)
+    except lxml.etree.ParserError:
+        # an empty document (or one with nothing but e.g. "<!"), which the
+        # other parsers read as a page without links or courses
+        return ParsedPage([], [])
+    links = [str(href) for href in root.xpath("//a/@href")]
+    blocks = []
+    for div in root.xpath(COURSEBLOCK_XPATH):
+        previous = div.getprevious()
+        follows = (previous is not None and is_lxml_courseblock(previous)
+                   and not (previous.tail or "").strip())
+        blocks.append(Block(lxml_text(div, "courseblocktitle"),
+                            lxml_text(div, "courseblockdesc"),
+                            div.get("class").split() == ["courseblock",
+                                                         "subsequence"],
+                            follows))
+    return ParsedPage(links, group_courses(blocks))
+
+
+### Streaming html.parser handler
+
+class CourseBlockParser(html.parser.HTMLParser):
+    '''
+    Collects the hrefs and the courseblocks of a page as it is fed,
+    without building a tree.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.links = []
+        self.blocks = []
+        self.block = None  # [title parts, desc parts, subsequence, follows]
+        self.depth = 0  # divs open inside the current block
+        self.field = None  # list collecting the text of the current p
+        self.done = set()  # fields of the current block already read
+        # whether nothing but whitespace came after the last block
+        self.chained = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href is not None:
+                self.links.append(href)
+
+        if self.block is None:
+            if tag == "div":
+                classes = (dict(attrs).get("class") or "").split()
+                if "courseblock" in classes:
+                    self.block = [[], [], classes == ["courseblock",
+                                                      "subsequence"],
+                                  self.chained]
+                    self.depth = 1
+                    self.done = set()
+                    return
+            self.chained = False
+            return
+
+        if tag == "div":
+            self.depth += 1
+        elif tag == "p" and self.field is None:
+            classes = (dict(attrs).get("class") or "").split()
+            for index, name in ((0, "courseblocktitle"),
+                                (1, "courseblockdesc")):
+                if name in classes and index not in self.done:
+                    self.field = self.block[index]
+                    self.done.add(index)
+                    break
+
+    def handle_endtag(self, tag):
+        if self.block is None:
+            self.chained = False
+            return
+        if tag == "p":
+            self.field = None
+        elif tag == "div":
+            self.depth -= 1
+            if self.depth == 0:
+                self.end_block()
+                self.chained = True
+
+    def end_block(self):
+        title, desc, subsequence, follows = self.block
+        self.blocks.append(Block("".join(title), "".join(desc),
+                                 subsequence, follows))
+        self.block = None
+        self.field = None
+
+    def handle_data(self, data):
+        if self.field is not None:
+            self.field.append(data)
+        elif self.block is None and data.strip():
+            self.chained = False
+
+    def handle_comment(self, data):
+        if self.block is None:
+            self.chained = False
+
+    def close(self):
+        super().close()
+        # a courseblock still open at the end of a truncated page is kept,
+        # as the tree builders do
+        if self.block is not None:
+            self.end_block()
+
+
+def parse_stream(text):
+    parser = CourseBlockParser()
+    parser.feed(text)
+    parser.close()
+    return ParsedPage(parser.links, group_courses(parser.blocks))
@@ -0,0 +1,63 @@
+# CS122: Course Search Engine Part 1
+# Local stand-in for the catalog web server
+#
+# Jake Underland
+#
+# Serves a saved copy of the catalog (for instance one made with
+# wget --mirror) over HTTP on localhost, so that the crawler can be run and
+# checked offline and without loading the real server:
+#
+#   python3 snapshot_server.py DIRECTORY [PORT]
+#
+# and then crawl it with
+#
+#   crawler.go(100, "course_map.json", "index.csv",
+#              starting_url="http://127.0.0.1:PORT/index.html",
+#              limiting_domain="127.0.0.1:PORT")
+#
+# (the limiting domain includes the port, since is_url_ok_to_follow
+# compares it with the whole network location).
+
+import functools
+import http.server
+import sys
+import threading
+
+DEFAULT_PORT = 8123
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start(directory, port=0):
+    '''
+    Serve directory from a background thread.
+
+    Inputs:
+        directory: the root of the snapshot
+        port: port to listen on (0 picks a free one)
+
+    Outputs:
+        (server, base URL); call server.shutdown() to stop it
+    '''
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, "http://127.0.0.1:%d/" % server.server_address[1]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("usage: python3 snapshot_server.py DIRECTORY [PORT]")
+        sys.exit(0)
+    port = int(sys.argv[2]) if len(sys.argv) == 3 else DEFAULT_PORT
+    handler = functools.partial(QuietHandler, directory=sys.argv[1])
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), handler)
+    print("Serving %s on http://127.0.0.1:%d/" % (sys.argv[1], port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,115 @@
+# CS122: Course Search Engine Part 1
+# Tests: the binary index gives the same answers as the CSV index
+#
+# Jake Underland
+#
+# Run with: python3 -m pytest test_binary_index.py
+
+import random
+
+import pytest
+
+import binary_index
+
+
+@pytest.mark.parametrize("course_ids", [
+    [], [0], [5], [2 ** 32 - 1], [0, 1, 2, 3], [1, 127, 128, 16383, 16384],
+    [3, 2 ** 21, 2 ** 28 + 7, 2 ** 32 - 1],
+    sorted(random.Random(0).sample(range(10 ** 6), 500))])
+def test_postings_round_trip(course_ids):
+    data = binary_index.encode_postings(course_ids)
+    assert binary_index.decode_postings(data, len(course_ids)) == course_ids
+    # trailing bytes (the next term's postings) are not read
+    assert binary_index.decode_postings(data + b"\x05\x80",
+                                        len(course_ids)) == course_ids
+
+
+def test_small_deltas_take_one_byte():
+    assert len(binary_index.encode_postings(range(100, 200))) == 100
+
+
+def write_csv(filename, rows):
+    with open(filename, "w") as f:
+        for course_id, word in rows:
+            f.write("%d|%s\n" % (course_id, word))
+
+
+def random_rows(seed, num_rows):
+    rng = random.Random(seed)
+    words = ["w%d" % i for i in range(50)] + ["café", "zebra", "a"]
+    return [(rng.randrange(2000), rng.choice(words)) for _ in range(num_rows)]
+
+
+@pytest.mark.parametrize("rows", [
+    [], [(7, "single")], random_rows(1, 20), random_rows(2, 3000)],
+    ids=["empty", "single", "small", "large"])
+def test_matches_csv_index(tmp_path, rows):
+    csv_filename = str(tmp_path / "index.csv")
+    filename = str(tmp_path / "index.bin")
+    write_csv(csv_filename, rows)
+    binary_index.convert(csv_filename, filename)
+    expected = binary_index.read_csv_index(csv_filename)
+
+    with binary_index.BinaryIndex(filename) as index:
+        assert len(index) == len(expected)
+        assert [index.term(i).decode() for i in range(len(index))] == \
+            sorted(expected)
+        for word, course_ids in expected.items():
+            assert word in index
+            assert index.count(word) == len(course_ids)
+            assert index.postings(word) == sorted(course_ids)
+        for word in ["", "missing", "w", "zzz"]:
+            assert word not in index
+            assert index.count(word) == 0
+            assert index.postings(word) == []
+
+
+def test_queries_match_set_operations(tmp_path):
+    rows = random_rows(3, 3000)
+    filename = str(tmp_path / "index.bin")
+    postings = {}
+    for course_id, word in rows:
+        postings.setdefault(word, set()).add(course_id)
+    binary_index.write_index(postings, filename)
+
+    rng = random.Random(4)
+    words = sorted(postings) + ["missing"]
+    with binary_index.BinaryIndex(filename) as index:
+        assert index.and_query([]) == []
+        assert index.or_query([]) == []
+        for _ in range(200):
+            terms = rng.sample(words, rng.randint(1, 4))
+            sets = [postings.get(t, set()) for t in terms]
+            assert index.and_query(terms) == sorted(set.intersection(*sets))
+            assert index.or_query(terms) == sorted(set.union(*sets))
+
+
+def test_header(tmp_path):
+    filename = str(tmp_path / "index.bin")
+    binary_index.write_index({"ab": [1, 2], "c": [3]}, filename)
+    with open(filename, "rb") as f:
+        data = f.read()
+    magic, num_terms, terms_size, postings_size = \
+        binary_index.HEADER.unpack_from(data)
+    assert magic == binary_index.MAGIC
+    assert (num_terms, terms_size, postings_size) == (2, 3, 3)
+    assert len(data) == binary_index.HEADER.size + \
+        3 * binary_index.ENTRY.size + terms_size + postings_size
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: b"",
+    lambda data: data[:binary_index.HEADER.size - 1],
+    lambda data: b"XIDX" + data[4:],
+    lambda data: data[:-1],
+    lambda data: data + b"\x00"],
+    ids=["empty", "short header", "magic", "truncated", "trailing"])
+def test_corrupt_file_is_rejected(tmp_path, corrupt):
+    filename = str(tmp_path / "index.bin")
+    binary_index.write_index({"ab": [1, 2], "c": [300]}, filename)
+    with open(filename, "rb") as f:
+        data = f.read()
+    with open(filename, "wb") as f:
+        f.write(corrupt(data))
+    with pytest.raises(ValueError):
+        binary_index.BinaryIndex(filename)
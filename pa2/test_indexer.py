@@ -0,0 +1,77 @@
+# CS122: Course Search Engine Part 1
+# Tests: the indexer's merge gives the same index as an in-memory one
+#
+# Jake Underland
+#
+# Run with: python3 -m pytest test_indexer.py
+
+import random
+
+import pytest
+
+import indexer
+
+
+def random_postings(rng, num_postings):
+    return {(rng.randrange(300), "w%d" % rng.randrange(40))
+            for _ in range(num_postings)}
+
+
+def build(run_dir, batches, memory_budget=indexer.MEMORY_BUDGET,
+          spill_each=False):
+    index = indexer.Indexer(str(run_dir), memory_budget)
+    for batch in batches:
+        index.add(batch)
+        if spill_each:
+            index.spill()
+    return index
+
+
+def read_index(filename):
+    with open(filename, newline="") as f:
+        return list(indexer.read_postings(f))
+
+
+@pytest.mark.parametrize("num_batches, fan_in", [
+    (0, indexer.MERGE_FAN_IN), (1, indexer.MERGE_FAN_IN),
+    (20, indexer.MERGE_FAN_IN), (20, 2), (20, 3), (20, 19), (20, 20)])
+def test_merge_matches_in_memory(tmp_path, num_batches, fan_in):
+    rng = random.Random(num_batches)
+    batches = [random_postings(rng, 50) for _ in range(num_batches)]
+    index = build(tmp_path / "runs", batches, spill_each=True)
+    assert len(index.runs) == num_batches
+    # some postings still in memory at the merge
+    index.add({(7, "memory")} | (batches[0] if batches else set()))
+
+    expected = sorted(set().union({(7, "memory")}, *batches))
+    filename = str(tmp_path / "index.csv")
+    assert index.merge(filename, fan_in) == len(expected)
+    assert read_index(filename) == expected
+    # the intermediate runs are gone, the crawl's runs are kept
+    run_dir = tmp_path / "runs"
+    names = sorted(p.name for p in run_dir.iterdir()) \
+        if run_dir.exists() else []
+    assert names == ["run-%05d.csv" % i for i in range(num_batches)]
+
+
+def test_budget_spills_runs(tmp_path):
+    rng = random.Random(1)
+    batches = [random_postings(rng, 30) for _ in range(10)]
+    index = build(tmp_path / "runs", batches, memory_budget=2000)
+    assert len(index.runs) > 1
+    filename = str(tmp_path / "index.csv")
+    index.merge(filename)
+    assert read_index(filename) == sorted(set().union(*batches))
+
+
+def test_empty(tmp_path):
+    index = indexer.Indexer(str(tmp_path / "runs"))
+    assert index.spill() is None
+    filename = str(tmp_path / "index.csv")
+    assert index.merge(filename) == 0
+    assert read_index(filename) == []
+
+
+def test_fan_in_must_be_at_least_2(tmp_path):
+    with pytest.raises(ValueError):
+        indexer.Indexer(str(tmp_path)).merge(str(tmp_path / "x"), 1)
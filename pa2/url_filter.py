@@ -0,0 +1,115 @@
+# CS122: Course Search Engine Part 1
+# Memoized link resolution and filtering
+#
+# Jake Underland
+#
+# Catalog pages link to the same few hundred URLs thousands of times, and
+# resolving and filtering each link (util.convert_if_relative_url and
+# util.is_url_ok_to_follow) re-parses it every time. A UrlFilter answers
+# the same questions for one limiting domain, with the rules prepared once
+# and the answers kept in bounded LRU caches.
+#
+# Resolving a relative link only depends on the directory of the page it
+# is on (unless the link is just a query or parameters), so resolutions
+# are cached per directory rather than per page, and are shared by all the
+# pages of a directory.
+
+import functools
+import os
+import urllib.parse
+
+import util
+
+CACHE_SIZE = 65536
+SCHEMES = frozenset(["http", "https"])
+EXTENSIONS = frozenset(["", ".html"])
+
+
+class UrlFilter(object):
+    def __init__(self, limiting_domain, cache_size=CACHE_SIZE):
+        '''
+        Constructor
+
+        Inputs:
+            limiting_domain: domain name the crawl stays within
+            cache_size: number of answers kept in each cache
+        '''
+        self.limiting_domain = limiting_domain
+        self.domain_suffix = "." + limiting_domain
+        self.is_ok = functools.lru_cache(maxsize=cache_size)(
+            self.is_ok_uncached)
+        self.resolve_in = functools.lru_cache(maxsize=cache_size)(
+            self.resolve_uncached)
+
+    def is_ok_uncached(self, url):
+        '''
+        Same as util.is_url_ok_to_follow(url, self.limiting_domain)
+        '''
+        if "mailto:" in url or "@" in url or url.startswith(util.ARCHIVES):
+            return False
+
+        parsed_url = urllib.parse.urlparse(url)
+        if parsed_url.scheme not in SCHEMES or parsed_url.netloc == "" \
+                or parsed_url.fragment != "" or parsed_url.query != "":
+            return False
+
+        loc = parsed_url.netloc
+        if loc != self.limiting_domain and \
+                not loc.endswith(self.domain_suffix):
+            return False
+        return os.path.splitext(parsed_url.path)[1] in EXTENSIONS
+
+    def resolve_uncached(self, base, href):
+        return util.convert_if_relative_url(base, util.remove_fragment(href))
+
+    def resolve(self, page_url, href):
+        '''
+        Same as util.convert_if_relative_url(page_url,
+        util.remove_fragment(href))
+        '''
+        if href[:1] in ("?", ";"):
+            return self.resolve_in(page_url, href)
+        return self.resolve_in(page_directory(page_url), href)
+
+    def links(self, page_url, hrefs):
+        '''
+        The URLs to follow among the hrefs of a page, resolved and without
+        fragments, in page order
+        '''
+        directory = page_directory(page_url)
+        links = []
+        for href in hrefs:
+            base = page_url if href[:1] in ("?", ";") else directory
+            url = self.resolve_in(base, href)
+            if url is not None and self.is_ok(url):
+                links.append(url)
+        return links
+
+    def cache_info(self):
+        '''
+        lru_cache statistics of the two caches
+        '''
+        return {"is_ok": self.is_ok.cache_info(),
+                "resolve": self.resolve_in.cache_info()}
+
+
+def page_directory(page_url):
+    '''
+    The directory of page_url (up to its last "/"), which resolves links
+    that are not just a query or parameters the same way as page_url does;
+    page_url itself if it has no path, or has a query, parameters or a
+    fragment.
+    '''
+    if "?" in page_url or ";" in page_url or "#" in page_url:
+        return page_url
+    if page_url.find("/", page_url.find("//") + 2) < 0:
+        return page_url
+    return page_url[:page_url.rfind("/") + 1]
+
+
+@functools.lru_cache(maxsize=None)
+def get_filter(limiting_domain):
+    '''
+    The UrlFilter of a domain, shared by everything in this process
+    '''
+    return UrlFilter(limiting_domain)
@@ -6,13 +6,16 @@ import bs4
 ######### DO NOT CHANGE THIS CODE  #########
 
 
-def get_request(url):
+def get_request(url, session=None, cache=None):
     '''
     Open a connection to the specified URL and if successful
     read the data.
 
     Inputs:
         url: must be an absolute URL
+        session: optional requests.Session, to reuse its pooled
+          connections
+        cache: optional http_cache.HttpCache to go through
 
     Outputs:
         request object or None
@@ -23,7 +26,10 @@ def get_request(url):
 
     if is_absolute_url(url):
         try:
-            r = requests.get(url)
+            if cache is not None:
+                r = cache.get(url, session)
+            else:
+                r = (session or requests).get(url)
             if r.status_code == 404 or r.status_code == 403:
                 r = None
         except Exception:
@@ -108,7 +114,7 @@ def convert_if_relative_url(current_url, new_url):
     if ext in [".edu", ".org", ".com", ".net"]:
         return "http://" + new_url
     elif new_url[:3] == "www":
-        return "http://" + new_path
+        return "http://" + new_url
     else:
         return urllib.parse.urljoin(current_url, new_url)
 
@@ -193,8 +199,8 @@ def find_sequence(tag):
     '''
     rv = []
     sib_tag = tag.next_sibling
-    while is_subsequence(sib_tag) or is_whitespace(tag):
-        if not is_whitespace(tag):
+    while is_subsequence(sib_tag) or is_whitespace(sib_tag):
+        if not is_whitespace(sib_tag):
             rv.append(sib_tag)
         sib_tag = sib_tag.next_sibling
     return rv
@@ -0,0 +1,99 @@
+### CS122, Winter 2021: Course search engine: terms benchmark
+###
+### Jake Underland
+
+# Runs the same multi-word terms searches through the catalog_index
+# lookups (one per word) and through the catalog_fts full-text table,
+# checks that they find the same courses, and reports queries/sec for
+# each number of words.
+#
+# Usage: python3 bench_terms.py [DATABASE] [QUERIES]
+
+import random
+import sys
+import time
+
+import courses
+
+WORD_COUNTS = (1, 2, 3, 4)
+
+
+def sample_terms(connection, num_words, num_queries, seed=0,
+                 attempts_per_query=10):
+    '''
+    Make terms strings of num_words distinct words, each taken from the
+    catalog entry of a random course (so that they find something). A
+    course with fewer words is passed over, and after
+    attempts_per_query * num_queries courses the sample stops.
+
+    Returns a list of at most num_queries strings.
+    '''
+    rng = random.Random(seed)
+    course_ids = [course_id for (course_id,) in connection.execute(
+        "SELECT course_id FROM catalog_index GROUP BY course_id "
+        "HAVING COUNT(DISTINCT word) >= ?", (num_words,))]
+    queries = []
+    if not course_ids:
+        return queries
+    for _ in range(attempts_per_query * num_queries):
+        if len(queries) == num_queries:
+            break
+        words = [word for (word,) in connection.execute(
+            "SELECT DISTINCT word FROM catalog_index WHERE course_id = ?",
+            (rng.choice(course_ids),))]
+        if len(words) >= num_words:
+            queries.append(" ".join(rng.sample(words, num_words)))
+    return queries
+
+
+def search(connection, terms, derived_tables):
+    sql, params = courses.build_query({"terms": terms}, derived_tables)
+    return connection.execute(sql, params).fetchall()
+
+
+def measure(connection, queries, derived_tables):
+    '''
+    Run all the queries.
+
+    Returns queries per second.
+    '''
+    start = time.perf_counter()
+    for terms in queries:
+        search(connection, terms, derived_tables)
+    return len(queries) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3:
+        print("usage: python3 bench_terms.py [DATABASE] [QUERIES]")
+        sys.exit(1)
+    database_filename = sys.argv[1] if len(sys.argv) > 1 \
+        else courses.DATABASE_FILENAME
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    connection = courses.connect(database_filename)
+    if "catalog_fts" not in courses.derived_tables(connection):
+        print("%s has no catalog_fts table (run migrate.py)"
+              % database_filename)
+        sys.exit(1)
+    joins = courses.derived_tables(connection) - set(["catalog_fts"])
+    fts = courses.derived_tables(connection)
+
+    print("%-6s %12s %12s %10s %12s" % ("words", "joins q/sec", "fts q/sec",
+                                        "speedup", "mismatches"))
+    for num_words in WORD_COUNTS:
+        queries = sample_terms(connection, num_words, num_queries)
+        if len(queries) < num_queries:
+            print("warning: only %d queries of %d words (no course has "
+                  "enough words)" % (len(queries), num_words))
+        if not queries:
+            continue
+        mismatches = sum(
+            sorted(search(connection, terms, joins)) !=
+            sorted(search(connection, terms, fts)) for terms in queries)
+        join_rate = measure(connection, queries, joins)
+        fts_rate = measure(connection, queries, fts)
+        print("%-6d %12.1f %12.1f %9.1fx %12d" % (
+            num_words, join_rate, fts_rate, fts_rate / join_rate,
+            mismatches))
+    connection.close()
@@ -0,0 +1,127 @@
+### CS122, Winter 2021: Course search engine: connection pool
+###
+### Jake Underland
+
+# Opening course-info.db for each search costs a file open, a schema read
+# and a cold page cache, and every query is parsed again. A
+# ConnectionPool keeps read-only connections open between searches:
+#
+#   - connections are opened with mode=ro and PRAGMA query_only, so a
+#     search can never write to the database;
+#   - the database file is memory-mapped (PRAGMA mmap_size), so pages are
+#     read straight from the OS page cache instead of being copied into
+#     each connection's cache;
+#   - each connection keeps its own compiled statements (the
+#     cached_statements of sqlite3.connect), and find_courses only
+#     produces a few distinct query strings, so they are parsed once per
+#     connection;
+#   - migrate.py puts the database in WAL mode, in which readers do not
+#     block a writer (or each other).
+#
+# A connection is checked out by one thread at a time and goes back to
+# the pool afterwards, so this works both for servers that keep their
+# worker threads and for those that start a thread per request. After the
+# database file is replaced, clear() makes sure no connection to the old
+# one is reused.
+
+import contextlib
+import os
+import sqlite3
+import threading
+import urllib.request
+
+MMAP_SIZE = 256 * 1024 * 1024
+CACHED_STATEMENTS = 256
+# idle connections kept for reuse (more are opened under load, and
+# closed when they come back to a full pool)
+MAX_IDLE = 16
+
+
+class ConnectionPool(object):
+    def __init__(self, database_filename, setup=None, max_idle=MAX_IDLE,
+                 mmap_size=MMAP_SIZE, cached_statements=CACHED_STATEMENTS):
+        '''
+        Constructor (no connection is opened until one is needed)
+
+        Inputs:
+          database_filename: the database
+          setup: function called with each new connection, e.g. to
+            register SQL functions
+          max_idle: number of idle connections kept open
+          mmap_size: bytes of the database memory-mapped by each
+            connection
+          cached_statements: compiled statements kept by each connection
+        '''
+        self.database_filename = database_filename
+        self.setup = setup
+        self.max_idle = max_idle
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.lock = threading.Lock()
+        self.idle = []
+        self.opened = 0
+        # incremented by clear(); connections opened before are not reused
+        self.generation = 0
+
+    def open(self):
+        '''
+        Open a new read-only connection
+        '''
+        uri = "file:%s?mode=ro" % urllib.request.pathname2url(
+            os.path.abspath(self.database_filename))
+        # sqlite3 would otherwise refuse to use the connection in any
+        # thread but this one, though the pool hands it to one thread at
+        # a time
+        connection = sqlite3.connect(
+            uri, uri=True, check_same_thread=False,
+            cached_statements=self.cached_statements)
+        connection.execute("PRAGMA query_only = ON")
+        connection.execute("PRAGMA mmap_size = %d" % self.mmap_size)
+        connection.execute("PRAGMA temp_store = MEMORY")
+        if self.setup is not None:
+            self.setup(connection)
+        with self.lock:
+            self.opened += 1
+        return connection
+
+    @contextlib.contextmanager
+    def connection(self):
+        '''
+        Check out a connection for the duration of a with block
+        '''
+        with self.lock:
+            generation = self.generation
+            # the most recently used connection has the warmest cache
+            connection = self.idle.pop() if self.idle else None
+        if connection is None:
+            connection = self.open()
+        try:
+            yield connection
+        finally:
+            with self.lock:
+                if len(self.idle) < self.max_idle and \
+                        generation == self.generation:
+                    self.idle.append(connection)
+                    connection = None
+            if connection is not None:
+                connection.close()
+
+    def clear(self):
+        '''
+        Close the idle connections, and those checked out when they come
+        back (e.g. because the database file has been replaced)
+        '''
+        with self.lock:
+            idle, self.idle = self.idle, []
+            self.generation += 1
+        for connection in idle:
+            connection.close()
+
+    def close(self):
+        '''
+        Close the idle connections (those checked out are closed when they
+        come back)
+        '''
+        with self.lock:
+            self.max_idle = 0
+        self.clear()
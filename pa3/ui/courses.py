@@ -6,13 +6,277 @@ from math import radians, cos, sin, asin, sqrt
 import sqlite3
 import os
 
+import connection_pool
+import result_cache
+
 
 # Use this filename for the database
 DATA_DIR = os.path.dirname(__file__)
 DATABASE_FILENAME = os.path.join(DATA_DIR, 'course-info.db')
 
 
-def find_courses(args_from_ui):
+# arguments that are about sections (all the others are about courses)
+SECTION_ARGS = frozenset(["day", "time_start", "time_end", "walking_time",
+                          "building", "enroll_lower", "enroll_upper"])
+WALKING_ARGS = frozenset(["walking_time", "building"])
+ENROLL_ARGS = frozenset(["enroll_lower", "enroll_upper"])
+TITLE_ARGS = frozenset(["terms", "dept"])
+
+# output attributes, in order: (expression, table it comes from, arguments
+# that show it -- None for always)
+OUTPUT = [("courses.dept", "courses", None),
+          ("courses.course_num", "courses", None),
+          ("sections.section_num", "sections", SECTION_ARGS),
+          ("meeting_patterns.day", "meeting_patterns", SECTION_ARGS),
+          ("meeting_patterns.time_start", "meeting_patterns", SECTION_ARGS),
+          ("meeting_patterns.time_end", "meeting_patterns", SECTION_ARGS),
+          ("sections.building_code AS building", "sections", WALKING_ARGS),
+          ("{walking_time} AS walking_time", "walking", WALKING_ARGS),
+          ("sections.enrollment", "sections", ENROLL_ARGS),
+          ("courses.title", "courses", TITLE_ARGS)]
+
+# how each table is joined in, in join order
+JOINS = [("courses", "courses"),
+         ("sections", "JOIN sections "
+          "ON sections.course_id = courses.course_id"),
+         ("meeting_patterns", "JOIN meeting_patterns "
+          "ON meeting_patterns.meeting_pattern_id = "
+          "sections.meeting_pattern_id"),
+         ("walking", None),
+         ("catalog_fts", "JOIN catalog_fts "
+          "ON catalog_fts.rowid = courses.course_id")]
+
+# the tables made by migrate.py that searches use if the database has them
+DERIVED_TABLES = frozenset(["walking_times", "catalog_fts"])
+
+# walking time from the building asked for to a section's building, and
+# the join that gives it: looked up in the walking_times table made by
+# migrate.py, or else computed for each section from the gps table
+WALKING = {True: ("walking_times.minutes",
+                  "JOIN walking_times "
+                  "ON walking_times.there = sections.building_code "
+                  "AND walking_times.here = ?"),
+           False: ("time_between(here.lon, here.lat, there.lon, there.lat)",
+                   "JOIN gps AS there "
+                   "ON there.building_code = sections.building_code "
+                   "AND there.lon IS NOT NULL AND there.lat IS NOT NULL "
+                   "JOIN gps AS here ON here.building_code = ? "
+                   "AND here.lon IS NOT NULL AND here.lat IS NOT NULL")}
+
+
+class Query(object):
+    '''
+    A SELECT under construction: the tables it needs, its WHERE predicates
+    and their parameters
+    '''
+
+    def __init__(self, derived_tables=DERIVED_TABLES):
+        self.derived_tables = derived_tables
+        self.walking_time, self.walking_join = \
+            WALKING["walking_times" in derived_tables]
+        self.tables = set(["courses"])
+        self.columns = []
+        self.join_params = []
+        self.predicates = []
+        self.params = []
+        self.order = []
+
+    def where(self, predicate, *params, table="courses"):
+        '''
+        Add a predicate on a table (which is joined in if need be), with
+        the values of its ? placeholders
+        '''
+        self.tables.add(table)
+        self.predicates.append(predicate)
+        self.params.extend(params)
+
+    def sql(self):
+        '''
+        The query and its parameters
+        '''
+        if self.tables & set(["meeting_patterns", "walking"]):
+            # sections link courses to their meeting patterns and buildings
+            self.tables.add("sections")
+        joins = [join or self.walking_join for table, join in JOINS
+                 if table in self.tables]
+        sql = "SELECT " + ", ".join(self.columns) + " FROM " + " ".join(joins)
+        if self.predicates:
+            sql += " WHERE " + " AND ".join(self.predicates)
+        if self.order:
+            sql += " ORDER BY " + ", ".join(self.order)
+        return sql, self.join_params + self.params
+
+
+def add_dept(query, args):
+    query.where("courses.dept = ?", args["dept"])
+
+
+def add_day(query, args):
+    days = list(args["day"])
+    query.where("meeting_patterns.day IN (%s)" % ", ".join("?" * len(days)),
+                *days, table="meeting_patterns")
+
+
+def add_time_start(query, args):
+    query.where("meeting_patterns.time_start >= ?", args["time_start"],
+                table="meeting_patterns")
+
+
+def add_time_end(query, args):
+    query.where("meeting_patterns.time_end <= ?", args["time_end"],
+                table="meeting_patterns")
+
+
+def add_enroll_lower(query, args):
+    query.where("sections.enrollment >= ?", args["enroll_lower"],
+                table="sections")
+
+
+def add_enroll_upper(query, args):
+    query.where("sections.enrollment <= ?", args["enroll_upper"],
+                table="sections")
+
+
+def add_walking_time(query, args):
+    query.join_params.append(args["building"])
+    query.where(query.walking_time + " <= ?", args["walking_time"],
+                table="walking")
+
+
+def add_terms(query, args):
+    # every word must be in the catalog entry of the course
+    words = sorted(set(args["terms"].lower().split()))
+    if "catalog_fts" in query.derived_tables:
+        # one full-text match of all the words (quoted, so that they are
+        # not read as FTS5 operators)
+        query.where("catalog_fts MATCH ?", " ".join(
+            '"%s"' % word.replace('"', '""') for word in words),
+            table="catalog_fts")
+        return
+    for word in words:
+        query.where("courses.course_id IN "
+                    "(SELECT course_id FROM catalog_index WHERE word = ?)",
+                    word)
+
+
+# the predicate of each argument ("building" only goes with walking_time)
+PREDICATES = {"dept": add_dept,
+              "day": add_day,
+              "time_start": add_time_start,
+              "time_end": add_time_end,
+              "enroll_lower": add_enroll_lower,
+              "enroll_upper": add_enroll_upper,
+              "walking_time": add_walking_time,
+              "terms": add_terms}
+
+
+def clean_args(args_from_ui):
+    '''
+    The search criteria without the empty ones (and without walking_time
+    or building if the other is missing)
+    '''
+    args = {key: value for key, value in args_from_ui.items()
+            if value not in (None, "", [])}
+    if "terms" in args and not args["terms"].split():
+        del args["terms"]
+    if "walking_time" not in args or "building" not in args:
+        args.pop("walking_time", None)
+        args.pop("building", None)
+    return args
+
+
+def normalize_args(args_from_ui):
+    '''
+    Put search criteria in a canonical, hashable form: searches that find
+    the same courses (e.g. with days in another order, or terms in
+    another order or case) get the same one.
+
+    Returns a tuple of sorted (key, value) pairs.
+    '''
+    args = clean_args(args_from_ui)
+    if "day" in args:
+        args["day"] = tuple(sorted(set(args["day"])))
+    if "terms" in args:
+        args["terms"] = " ".join(sorted(set(args["terms"].lower().split())))
+    return tuple(sorted((key, tuple(value) if isinstance(value, list)
+                         else value) for key, value in args.items()))
+
+
+def build_query(args_from_ui, derived_tables=DERIVED_TABLES,
+                ranked=False):
+    '''
+    Turn search criteria into a parameterized query that only joins the
+    tables it needs (derived_tables are the DERIVED_TABLES the database
+    has). If ranked, courses found by terms are sorted best match first
+    (by BM25, which needs the catalog_fts table).
+
+    Returns a pair: the SQL string and the list of its parameters, or
+    None if there are no criteria.
+    '''
+    args = clean_args(args_from_ui)
+    if not args:
+        return None
+
+    query = Query(derived_tables)
+    for key in sorted(args):
+        if key in PREDICATES:
+            PREDICATES[key](query, args)
+    if ranked and "catalog_fts" in query.tables:
+        query.order.append("bm25(catalog_fts)")
+
+    for column, table, shown_by in OUTPUT:
+        if shown_by is None or shown_by & args.keys():
+            query.columns.append(
+                column.format(walking_time=query.walking_time))
+            query.tables.add(table)
+    return query.sql()
+
+
+def time_between(lon1, lat1, lon2, lat2):
+    '''
+    compute_time_between as an SQL function: NULL if a coordinate is NULL
+    '''
+    if None in (lon1, lat1, lon2, lat2):
+        return None
+    return compute_time_between(lon1, lat1, lon2, lat2)
+
+
+def add_functions(connection):
+    '''
+    Register the SQL functions the queries use
+    '''
+    connection.create_function("time_between", 4, time_between,
+                               deterministic=True)
+
+
+def connect(database_filename=DATABASE_FILENAME):
+    '''
+    Open the database (read-write), with the functions the queries use
+    '''
+    connection = sqlite3.connect(database_filename)
+    add_functions(connection)
+    return connection
+
+
+# read-only connections find_courses reuses from one search to the next
+POOL = connection_pool.ConnectionPool(DATABASE_FILENAME, setup=add_functions)
+
+# recent results of find_courses, by normalized search; when the database
+# changes, the results and the pooled connections are dropped
+RESULT_CACHE = result_cache.ResultCache(
+    DATABASE_FILENAME, on_change=lambda: POOL.clear())
+
+
+def derived_tables(connection):
+    '''
+    The DERIVED_TABLES the database has
+    '''
+    return frozenset(name for (name,) in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")
+        if name in DERIVED_TABLES)
+
+
+def find_courses(args_from_ui, ranked=False):
     '''
     Takes a dictionary containing search criteria and returns courses
     that match the criteria.  The dictionary will contain some of the
@@ -29,13 +293,25 @@ def find_courses(args_from_ui):
       - building a string
       - terms a string: "quantum plato"]
 
+    If ranked, courses found by terms come best match first. Recent
+    results are served from RESULT_CACHE.
+
     Returns a pair: list of attribute names in order and a list
     containing query results.
     '''
-
-    # replace with a list of the attribute names in order and a list
-    # of query results.
-    return ([], [])
+    key = (normalize_args(args_from_ui), ranked)
+    result, generation = RESULT_CACHE.get(key)
+    if result is None:
+        with POOL.connection() as connection:
+            query = build_query(dict(key[0]), derived_tables(connection),
+                                ranked)
+            if query is None:
+                return ([], [])
+            cursor = connection.execute(*query)
+            result = (get_header(cursor), cursor.fetchall())
+        RESULT_CACHE.put(key, result, generation)
+    # copies, so that callers cannot change what is cached
+    return (list(result[0]), list(result[1]))
 
 
 ########### auxiliary functions #################
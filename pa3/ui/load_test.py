@@ -0,0 +1,142 @@
+### CS122, Winter 2021: Course search engine: load test
+###
+### Jake Underland
+
+# Serves the Django application of ui/wsgi.py with a threaded WSGI server
+# and has a number of concurrent clients run searches against it for a
+# while, reporting requests/sec and latencies for each number of
+# clients. For comparison, --no-pool has find_courses open a new
+# connection for every search, and --no-cache has it run every search
+# (instead of serving repeated ones from its result cache).
+#
+# Usage: python3 load_test.py [--database DATABASE] [--seconds SECONDS]
+#                             [--clients N [N ...]] [--no-pool]
+#                             [--no-cache]
+
+import argparse
+import os
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+import wsgiref.simple_server
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ui.settings")
+
+import connection_pool
+import courses
+import result_cache
+from ui.wsgi import application
+
+# searches as the form sends them
+SEARCHES = [{"time_0": 930, "time_1": 1500, "days": ["MWF"]},
+            {"dept": "CMSC", "days": ["MWF", "TR"], "time_0": 1030,
+             "time_1": 1500, "enrollment_0": 20, "enrollment_1": 1000,
+             "query": "computer science"},
+            {"dept": "MATH"},
+            {"query": "quantum plato"},
+            {"time_and_building_0": 5, "time_and_building_1": "RY",
+             "days": ["TR"]},
+            {"enrollment_0": 10, "enrollment_1": 30, "days": ["MW"]}]
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn,
+                          wsgiref.simple_server.WSGIServer):
+    daemon_threads = True
+    # the listen backlog, so that no client is refused under load
+    request_queue_size = 128
+
+
+class QuietHandler(wsgiref.simple_server.WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def search_urls(base_url):
+    return [base_url + "?" + urllib.parse.urlencode(search, doseq=True)
+            for search in SEARCHES]
+
+
+def client(urls, deadline, latencies, errors):
+    '''
+    Request the urls round-robin until the deadline, appending the
+    latency of each request to latencies (and failed requests to errors)
+    '''
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(urls[i % len(urls)]) as response:
+                response.read()
+            latencies.append(time.perf_counter() - start)
+        except OSError as e:
+            errors.append(e)
+        i += 1
+
+
+def run(urls, num_clients, seconds):
+    '''
+    Run num_clients clients for seconds.
+
+    Returns (requests/sec, latencies in seconds sorted, number of errors)
+    '''
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(
+        urls, start + seconds, latencies, errors))
+        for _ in range(num_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, sorted(latencies), len(errors)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load test the search UI.")
+    parser.add_argument("--database", default=courses.DATABASE_FILENAME)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, nargs="+",
+                        default=[1, 2, 4, 8])
+    parser.add_argument("--no-pool", action="store_true",
+                        help="open a new connection for every search")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not cache search results")
+    args = parser.parse_args()
+    if not os.path.exists(args.database):
+        print("%s does not exist (run get-db.sh)" % args.database)
+        sys.exit(1)
+
+    courses.POOL = connection_pool.ConnectionPool(
+        args.database, setup=courses.add_functions,
+        max_idle=0 if args.no_pool else connection_pool.MAX_IDLE)
+    courses.RESULT_CACHE = result_cache.ResultCache(
+        args.database, on_change=courses.POOL.clear,
+        max_entries=0 if args.no_cache else result_cache.DEFAULT_MAX_ENTRIES)
+    server = wsgiref.simple_server.make_server(
+        "127.0.0.1", 0, application, server_class=ThreadingWSGIServer,
+        handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = search_urls("http://127.0.0.1:%d/" % server.server_port)
+    # warm up (Django's URL resolver and templates, the OS page cache)
+    run(urls, 1, min(1, args.seconds))
+
+    print("%-8s %10s %10s %10s %8s" % ("clients", "req/sec", "p50 ms",
+                                       "p95 ms", "errors"))
+    for num_clients in args.clients:
+        rate, latencies, num_errors = run(urls, num_clients, args.seconds)
+        print("%-8d %10.1f %10.1f %10.1f %8d" % (
+            num_clients, rate, 1000 * percentile(latencies, 0.5),
+            1000 * percentile(latencies, 0.95), num_errors))
+    print("connections opened: %d" % courses.POOL.opened)
+    print(courses.RESULT_CACHE.report())
+    server.shutdown()
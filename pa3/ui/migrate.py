@@ -0,0 +1,263 @@
+### CS122, Winter 2021: Course search engine: database migrations
+###
+### Jake Underland
+
+# course-info.db comes without any index, so every search scans whole
+# tables. The migrations here add what find_courses needs, and are
+# recorded in the database's user_version, so running this again only
+# applies the ones that are new.
+#
+# The walking_times table is derived from the gps table, and catalog_fts
+# from catalog_index. A checksum of the source table is kept with each,
+# and running this again rebuilds them if their source has changed since
+# (after the crawler's index is imported again, say).
+#
+# Usage: python3 migrate.py [DATABASE]
+
+import hashlib
+import sqlite3
+import sys
+
+import numpy as np
+
+import courses
+
+# indexes covering the columns find_courses filters on, joins on and
+# outputs, so that each table is searched through an index and never read
+COVERING_INDEXES = '''
+CREATE INDEX IF NOT EXISTS courses_dept
+    ON courses (dept, course_id, course_num, title);
+CREATE INDEX IF NOT EXISTS courses_course_id
+    ON courses (course_id, dept, course_num, title);
+CREATE INDEX IF NOT EXISTS sections_course_id
+    ON sections (course_id, meeting_pattern_id, enrollment, section_num,
+                 building_code);
+CREATE INDEX IF NOT EXISTS sections_meeting_pattern_id
+    ON sections (meeting_pattern_id, enrollment, course_id, section_num,
+                 building_code);
+CREATE INDEX IF NOT EXISTS sections_enrollment
+    ON sections (enrollment, course_id, meeting_pattern_id, section_num,
+                 building_code);
+CREATE INDEX IF NOT EXISTS sections_building_code
+    ON sections (building_code, course_id, meeting_pattern_id, enrollment,
+                 section_num);
+CREATE INDEX IF NOT EXISTS meeting_patterns_day
+    ON meeting_patterns (day, time_start, time_end, meeting_pattern_id);
+CREATE INDEX IF NOT EXISTS meeting_patterns_time_start
+    ON meeting_patterns (time_start, time_end, day, meeting_pattern_id);
+CREATE INDEX IF NOT EXISTS meeting_patterns_meeting_pattern_id
+    ON meeting_patterns (meeting_pattern_id, day, time_start, time_end);
+CREATE INDEX IF NOT EXISTS catalog_index_word
+    ON catalog_index (word, course_id);
+CREATE INDEX IF NOT EXISTS gps_building_code
+    ON gps (building_code, lon, lat);
+'''
+
+
+# walking minutes from every building to every other one, so that a
+# walking_time search is an index range (here = ? AND minutes <= ?) joined
+# to sections by building
+WALKING_TIMES = '''
+CREATE TABLE IF NOT EXISTS walking_times (
+    here varchar(10) NOT NULL,
+    minutes real NOT NULL,
+    there varchar(10) NOT NULL,
+    PRIMARY KEY (here, minutes, there)
+) WITHOUT ROWID;
+'''
+
+
+# the checksum of the table each derived table was built from
+DERIVED_FROM = '''
+CREATE TABLE IF NOT EXISTS derived_from (
+    name TEXT PRIMARY KEY,
+    checksum TEXT NOT NULL
+);
+'''
+
+
+# the words of each course's catalog entry, as one full-text document
+# whose rowid is the course_id, so that a multi-word search is one FTS5
+# match instead of one catalog_index lookup per word ("_" is kept in
+# tokens, since the crawler's words can contain it)
+CATALOG_FTS = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5 (
+    words, tokenize = "unicode61 remove_diacritics 0 tokenchars '_'"
+);
+'''
+
+
+def create_covering_indexes(connection):
+    connection.executescript(COVERING_INDEXES)
+
+
+def walking_minutes(lon, lat):
+    '''
+    Walking minutes between all pairs of points, computed as
+    courses.compute_time_between does.
+
+    Inputs:
+      lon, lat: arrays of n longitudes and latitudes (decimal degrees)
+
+    Returns an n x n array whose (i, j) element is the walking time from
+    point i to point j.
+    '''
+    lon = np.radians(np.asarray(lon, dtype=float))
+    lat = np.radians(np.asarray(lat, dtype=float))
+    dlon = lon[np.newaxis, :] - lon[:, np.newaxis]
+    dlat = lat[np.newaxis, :] - lat[:, np.newaxis]
+    a = (np.sin(dlat / 2) ** 2 +
+         np.cos(lat)[:, np.newaxis] * np.cos(lat)[np.newaxis, :] *
+         np.sin(dlon / 2) ** 2)
+    meters = 6367 * 1000 * 2 * np.arcsin(np.sqrt(a))
+    return meters / (1.1 * 60)
+
+
+def checksum(connection, query):
+    '''
+    A checksum of the rows a query returns
+    '''
+    digest = hashlib.sha1()
+    for row in connection.execute(query):
+        digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+
+def gps_checksum(connection):
+    '''
+    A checksum of the contents of the gps table
+    '''
+    return checksum(connection, "SELECT building_code, lon, lat FROM gps "
+                                "ORDER BY building_code, lon, lat")
+
+
+def catalog_checksum(connection):
+    '''
+    A checksum of the contents of the catalog_index table (read in the
+    order of its catalog_index_word index)
+    '''
+    return checksum(connection, "SELECT word, course_id FROM catalog_index "
+                                "ORDER BY word, course_id")
+
+
+def record_checksum(connection, name, value):
+    connection.executescript(DERIVED_FROM)
+    connection.execute(
+        "INSERT OR REPLACE INTO derived_from (name, checksum) "
+        "VALUES (?, ?)", (name, value))
+
+
+def create_walking_times(connection):
+    connection.executescript(WALKING_TIMES)
+    connection.execute("DELETE FROM walking_times")
+    record_checksum(connection, "walking_times", gps_checksum(connection))
+    buildings = connection.execute(
+        "SELECT building_code, lon, lat FROM gps "
+        "WHERE lon IS NOT NULL AND lat IS NOT NULL "
+        "GROUP BY building_code").fetchall()
+    if not buildings:
+        return
+    codes = [code for code, _, _ in buildings]
+    minutes = walking_minutes([lon for _, lon, _ in buildings],
+                              [lat for _, _, lat in buildings])
+    connection.executemany(
+        "INSERT INTO walking_times (here, minutes, there) VALUES (?, ?, ?)",
+        ((codes[i], float(minutes[i, j]), codes[j])
+         for i in range(len(codes)) for j in range(len(codes))))
+
+
+def create_catalog_fts(connection):
+    try:
+        connection.executescript(CATALOG_FTS)
+    except sqlite3.OperationalError:
+        # SQLite without FTS5: searches keep using catalog_index
+        return
+    connection.execute("DELETE FROM catalog_fts")
+    record_checksum(connection, "catalog_fts", catalog_checksum(connection))
+    connection.execute(
+        "INSERT INTO catalog_fts (rowid, words) "
+        "SELECT course_id, group_concat(word, ' ') FROM catalog_index "
+        "GROUP BY course_id")
+    connection.execute(
+        "INSERT INTO catalog_fts (catalog_fts) VALUES ('optimize')")
+
+
+def use_wal(connection):
+    # in WAL mode readers (the connection_pool's) do not block a writer,
+    # nor the other way around
+    connection.execute("PRAGMA journal_mode = WAL")
+
+
+# in order; the database's user_version is how many have been applied
+MIGRATIONS = [create_covering_indexes, create_walking_times,
+              create_catalog_fts, use_wal]
+
+# (name, checksum of its source table, function building it) of the tables
+# refresh_derived_tables keeps up to date
+DERIVED = [("walking_times", gps_checksum, create_walking_times),
+           ("catalog_fts", catalog_checksum, create_catalog_fts)]
+
+
+def migrate(connection):
+    '''
+    Apply the migrations the database does not have yet.
+
+    Returns the number of migrations applied.
+    '''
+    (version,) = connection.execute("PRAGMA user_version").fetchone()
+    for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+        migration(connection)
+        connection.execute("PRAGMA user_version = %d" % number)
+        connection.commit()
+    rebuilt = refresh_derived_tables(connection)
+    if version < len(MIGRATIONS) or rebuilt:
+        # statistics for the query planner to choose between the indexes
+        connection.execute("ANALYZE")
+        connection.commit()
+    return len(MIGRATIONS) - min(version, len(MIGRATIONS))
+
+
+def refresh_derived_tables(connection):
+    '''
+    Rebuild the derived tables whose source table has changed since they
+    were built.
+
+    Returns the names of the tables rebuilt.
+    '''
+    return [name for name, source_checksum, create in DERIVED
+            if refresh_derived_table(connection, name, source_checksum,
+                                     create)]
+
+
+def refresh_derived_table(connection, name, source_checksum, create):
+    '''
+    Rebuild one derived table with create if the checksum of its source
+    table (computed by source_checksum) is not the one recorded for it.
+
+    Returns whether it was rebuilt.
+    '''
+    if name not in courses.derived_tables(connection):
+        return False
+    stored = None
+    if connection.execute("SELECT 1 FROM sqlite_master WHERE type = "
+                          "'table' AND name = 'derived_from'").fetchone():
+        stored = connection.execute(
+            "SELECT checksum FROM derived_from WHERE name = ?",
+            (name,)).fetchone()
+    if stored is not None and stored[0] == source_checksum(connection):
+        return False
+    create(connection)
+    connection.commit()
+    return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        print("usage: python3 migrate.py [DATABASE]")
+        sys.exit(1)
+    database_filename = sys.argv[1] if len(sys.argv) == 2 \
+        else courses.DATABASE_FILENAME
+    connection = sqlite3.connect(database_filename)
+    applied = migrate(connection)
+    connection.close()
+    print("%s: %d migration(s) applied" % (database_filename, applied))
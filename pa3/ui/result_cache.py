@@ -0,0 +1,154 @@
+### CS122, Winter 2021: Course search engine: result cache
+###
+### Jake Underland
+
+# Searches repeat: the same department, days and times come up over and
+# over. A ResultCache keeps recent results in memory, keyed by the
+# normalized search (see courses.normalize_args), so a repeated search
+# does not touch SQLite at all:
+#
+#   - at most max_entries results are kept; the least recently used is
+#     evicted to make room;
+#   - a result older than ttl seconds is not served (it is looked up
+#     again);
+#   - when the database file (or its write-ahead log) changes, every
+#     result is dropped, and so is a result that was being looked up when
+#     it changed: each change starts a new generation, and put only
+#     stores a result looked up in the current one.
+
+import collections
+import os
+import threading
+import time
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 5 * 60
+
+
+def file_signature(filename):
+    '''
+    Something that changes when the file is modified or replaced (None
+    if it does not exist or is empty)
+    '''
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    if stat.st_size == 0:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class ResultCache(object):
+    def __init__(self, database_filename, max_entries=DEFAULT_MAX_ENTRIES,
+                 ttl=DEFAULT_TTL, on_change=None):
+        '''
+        Constructor
+
+        Inputs:
+          database_filename: the database the results come from
+          max_entries: number of results kept (0 to cache nothing)
+          ttl: seconds during which a result is served
+          on_change: function called when the database has changed
+        '''
+        self.database_filename = database_filename
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # key -> (time, result)
+        self.signature = self.database_signature()
+        # number of database changes seen
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def database_signature(self):
+        # readers create an empty log, which is not a change
+        return (file_signature(self.database_filename),
+                file_signature(self.database_filename + "-wal"))
+
+    def check_database(self):
+        '''
+        Drop every result if the database has changed since the last check
+        '''
+        signature = self.database_signature()
+        if signature == self.signature:
+            return
+        with self.lock:
+            self.signature = signature
+            self.generation += 1
+            self.entries.clear()
+            self.invalidations += 1
+        if self.on_change is not None:
+            self.on_change()
+
+    def get(self, key):
+        '''
+        Look up the result stored for key.
+
+        Returns a pair: the result, or None, and the generation to pass
+        to put with the result of looking it up in the database
+        '''
+        self.check_database()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, self.generation
+            if time.monotonic() - entry[0] >= self.ttl:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None, self.generation
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], self.generation
+
+    def put(self, key, result, generation):
+        '''
+        Store the result for key, evicting the least recently used
+        results if needed. The result is dropped if the database has
+        changed since the get that returned generation, since it may have
+        been read before the change.
+        '''
+        self.check_database()
+        with self.lock:
+            if self.max_entries <= 0 or generation != self.generation:
+                return
+            self.entries[key] = (time.monotonic(), result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        '''
+        Counts of hits, misses (expirations included), expirations,
+        evictions and invalidations, the hit rate and the number of
+        results stored
+        '''
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "expirations": self.expirations,
+                    "evictions": self.evictions,
+                    "invalidations": self.invalidations,
+                    "hit_rate": self.hits / lookups if lookups else 0,
+                    "entries": len(self.entries)}
+
+    def report(self):
+        stats = self.stats()
+        stats["hit_rate"] *= 100
+        return ("results: %(hits)d hits, %(misses)d misses (hit rate "
+                "%(hit_rate).1f%%), %(expirations)d expired, "
+                "%(evictions)d evicted, %(invalidations)d invalidations, "
+                "%(entries)d stored" % stats)
@@ -1,3 +1,247 @@
 from django.test import TestCase
 
 # Create your tests here.
+import os
+import re
+import sqlite3
+import tempfile
+
+import courses
+import migrate
+import result_cache
+
+# the tables of course-info.db
+SCHEMA = '''
+CREATE TABLE courses (course_id integer, dept varchar(4),
+                      course_num varchar(5), title varchar(200));
+CREATE TABLE sections (section_id integer, course_id integer,
+                       section_num integer, meeting_pattern_id integer,
+                       enrollment integer, building_code varchar(10));
+CREATE TABLE meeting_patterns (meeting_pattern_id integer, day varchar(5),
+                               time_start integer, time_end integer);
+CREATE TABLE gps (building_code varchar(10), lon real, lat real);
+CREATE TABLE catalog_index (course_id integer, word varchar(100));
+'''
+
+
+# a full-text match is a lookup in the FTS5 index, though it is shown as
+# a SCAN of the virtual table (with an M in its index constraints)
+FULL_TEXT_MATCH = re.compile(r'^SCAN \w+ VIRTUAL TABLE INDEX \d+:=?M')
+
+
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.executescript(SCHEMA)
+        migrate.migrate(self.connection)
+
+    def tearDown(self):
+        self.connection.close()
+
+    def query_plan(self, args_from_ui):
+        sql, params = courses.build_query(args_from_ui)
+        return [row[3] for row in self.connection.execute(
+            'EXPLAIN QUERY PLAN ' + sql, params)]
+
+    def assertNoScans(self, args_from_ui):
+        plan = self.query_plan(args_from_ui)
+        scans = [step for step in plan if step.startswith('SCAN')
+                 and not FULL_TEXT_MATCH.match(step)]
+        self.assertEqual(scans, [], '\n'.join(plan))
+
+    def test_example_0_uses_indexes(self):
+        self.assertNoScans(courses.EXAMPLE_0)
+
+    def test_example_1_uses_indexes(self):
+        self.assertNoScans(courses.EXAMPLE_1)
+
+    def test_walking_time_uses_indexes(self):
+        self.assertNoScans({'walking_time': 10, 'building': 'RY'})
+
+    def test_only_needed_tables_are_joined(self):
+        sql, params = courses.build_query({'terms': 'Quantum plato'})
+        self.assertNotIn('sections', sql)
+        self.assertEqual(params, ['"plato" "quantum"'])
+        sql, params = courses.build_query({'terms': 'Quantum plato'},
+                                          frozenset())
+        self.assertNotIn('catalog_fts', sql)
+        self.assertEqual(params, ['plato', 'quantum'])
+        self.assertIsNone(courses.build_query({}))
+
+
+class WalkingTimeTests(TestCase):
+    BUILDINGS = [('RY', -87.5996, 41.7906), ('BH', -87.5985, 41.7896),
+                 ('HM', -87.6035, 41.7880)]
+
+    def test_matrix_matches_compute_time_between(self):
+        connection = sqlite3.connect(':memory:')
+        connection.executescript(SCHEMA)
+        connection.executemany('INSERT INTO gps VALUES (?, ?, ?)',
+                               self.BUILDINGS)
+        migrate.migrate(connection)
+        for here, lon1, lat1 in self.BUILDINGS:
+            for there, lon2, lat2 in self.BUILDINGS:
+                (minutes,) = connection.execute(
+                    'SELECT minutes FROM walking_times '
+                    'WHERE here = ? AND there = ?', (here, there)).fetchone()
+                self.assertAlmostEqual(minutes, courses.compute_time_between(
+                    lon1, lat1, lon2, lat2))
+        connection.close()
+
+    def test_matrix_rebuilt_when_gps_changes(self):
+        connection = sqlite3.connect(':memory:')
+        connection.executescript(SCHEMA)
+        connection.executemany('INSERT INTO gps VALUES (?, ?, ?)',
+                               self.BUILDINGS[:2])
+        migrate.migrate(connection)
+        connection.execute('INSERT INTO gps VALUES (?, ?, ?)',
+                           self.BUILDINGS[2])
+        migrate.migrate(connection)
+        (count,) = connection.execute(
+            'SELECT COUNT(*) FROM walking_times').fetchone()
+        self.assertEqual(count, 9)
+        self.assertEqual(migrate.refresh_derived_tables(connection), [])
+        connection.close()
+
+    def test_fallback_skips_missing_coordinates(self):
+        connection = courses.connect(':memory:')
+        connection.executescript(SCHEMA)
+        connection.executemany('INSERT INTO gps VALUES (?, ?, ?)',
+                               self.BUILDINGS + [('XX', None, None)])
+        connection.execute("INSERT INTO courses VALUES "
+                           "(1, 'CMSC', '12100', 'CS')")
+        connection.execute('INSERT INTO meeting_patterns VALUES '
+                           "(1, 'MWF', 930, 1020)")
+        connection.executemany('INSERT INTO sections VALUES '
+                               '(?, 1, ?, 1, 30, ?)',
+                               [(1, 1, 'RY'), (2, 2, 'XX')])
+        sql, params = courses.build_query(
+            {'walking_time': 10, 'building': 'RY'}, frozenset())
+        rows = connection.execute(sql, params).fetchall()
+        self.assertEqual([row[6] for row in rows], ['RY'])
+        sql, params = courses.build_query(
+            {'walking_time': 10, 'building': 'XX'}, frozenset())
+        self.assertEqual(connection.execute(sql, params).fetchall(), [])
+        self.assertIsNone(courses.time_between(None, 1, 2, 3))
+        connection.close()
+
+
+class TermsTests(TestCase):
+    COURSES = [(1, 'CMSC', '12100', 'Computer Science with Applications I'),
+               (2, 'PHIL', '25000', 'History of Philosophy I'),
+               (3, 'PHYS', '23400', 'Quantum Mechanics I')]
+    WORDS = [(1, 'computer'), (1, 'science'), (1, 'programming'),
+             (1, 'applications'), (2, 'plato'),
+             (2, 'philosophy'), (3, 'quantum'), (3, 'science'),
+             (3, 'plato')]
+
+    def setUp(self):
+        self.connection = courses.connect(':memory:')
+        self.connection.executescript(SCHEMA)
+        self.connection.executemany('INSERT INTO courses VALUES (?, ?, ?, ?)',
+                                    self.COURSES)
+        self.connection.executemany('INSERT INTO catalog_index VALUES (?, ?)',
+                                    self.WORDS)
+        migrate.migrate(self.connection)
+
+    def tearDown(self):
+        self.connection.close()
+
+    def search(self, terms, derived_tables=courses.DERIVED_TABLES,
+               ranked=False):
+        sql, params = courses.build_query({'terms': terms}, derived_tables,
+                                          ranked)
+        return [row[1] for row in self.connection.execute(sql, params)]
+
+    def test_full_text_matches_catalog_index(self):
+        for terms in ['science', 'plato science', 'Quantum PLATO',
+                      'computer plato', 'nothing', 'say "plato"']:
+            self.assertEqual(sorted(self.search(terms)),
+                             sorted(self.search(terms, frozenset())), terms)
+
+    def test_rebuilt_when_catalog_index_changes(self):
+        self.connection.execute('DELETE FROM catalog_index WHERE word = ?',
+                                ('plato',))
+        self.connection.execute('INSERT INTO catalog_index VALUES (?, ?)',
+                                (1, 'aristotle'))
+        migrate.migrate(self.connection)
+        for terms in ['plato', 'aristotle', 'science', 'computer aristotle']:
+            self.assertEqual(sorted(self.search(terms)),
+                             sorted(self.search(terms, frozenset())), terms)
+        self.assertEqual(self.search('aristotle'), ['12100'])
+        self.assertEqual(migrate.refresh_derived_tables(self.connection), [])
+
+    def test_ranked(self):
+        # the shorter catalog entry is the better match
+        self.assertEqual(self.search('science', ranked=True),
+                         ['23400', '12100'])
+
+
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.write(fd, b'database')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_normalize_args(self):
+        self.assertEqual(
+            courses.normalize_args({'day': ['TR', 'MWF'], 'dept': '',
+                                    'terms': 'Science  computer'}),
+            courses.normalize_args({'day': ['MWF', 'TR', 'MWF'],
+                                    'terms': 'computer science',
+                                    'building': 'RY'}))
+        self.assertNotEqual(courses.normalize_args({'day': ['MWF']}),
+                            courses.normalize_args({'day': ['TR']}))
+
+    def test_lru(self):
+        cache = result_cache.ResultCache(self.filename, max_entries=2)
+        cache.put('a', 1, cache.generation)
+        cache.put('b', 2, cache.generation)
+        self.assertEqual(cache.get('a'), (1, 0))
+        cache.put('c', 3, cache.generation)
+        self.assertEqual(cache.get('b'), (None, 0))
+        self.assertEqual(cache.get('c'), (3, 0))
+        self.assertEqual((cache.hits, cache.misses, cache.evictions),
+                         (2, 1, 1))
+
+    def test_ttl(self):
+        cache = result_cache.ResultCache(self.filename, ttl=0)
+        cache.put('a', 1, cache.generation)
+        self.assertIsNone(cache.get('a')[0])
+        self.assertEqual(cache.expirations, 1)
+
+    def change_database(self):
+        with open(self.filename, 'ab') as f:
+            f.write(b' changed')
+
+    def test_invalidated_when_database_changes(self):
+        changes = []
+        cache = result_cache.ResultCache(
+            self.filename, on_change=lambda: changes.append(True))
+        cache.put('a', 1, cache.generation)
+        self.change_database()
+        self.assertEqual(cache.get('a'), (None, 1))
+        self.assertEqual((cache.invalidations, changes), (1, [True]))
+
+    def test_result_looked_up_before_change_is_dropped(self):
+        cache = result_cache.ResultCache(self.filename)
+        # a search misses and starts querying; the database changes, and
+        # another search notices (clearing the cache) before the first one
+        # stores its result, which may predate the change
+        result, generation = cache.get('a')
+        self.change_database()
+        self.assertEqual(cache.get('b'), (None, 1))
+        cache.put('a', 'old', generation)
+        self.assertEqual(cache.get('a'), (None, 1))
+        # the same without another search in between
+        result, generation = cache.get('a')
+        self.change_database()
+        cache.put('a', 'old', generation)
+        self.assertEqual(cache.get('a'), (None, 2))
+        # a result looked up after the change is stored
+        result, generation = cache.get('a')
+        cache.put('a', 'new', generation)
+        self.assertEqual(cache.get('a'), ('new', 2))